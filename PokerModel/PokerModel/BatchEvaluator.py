@@ -0,0 +1,93 @@
+import itertools
+import threading
+
+import numpy as np
+from treys import Card
+
+from .Cards import CARD_INTS
+from .SharedEvaluator import get_evaluator, lookup_to_arrays
+
+# rank (0..12), suit (0..3), rank prime and rank bit of every card id, read from the treys card ints
+CARD_RANKS = np.array([Card.get_rank_int(card) for card in CARD_INTS], dtype=np.int64)
+CARD_SUITS = np.arange(len(CARD_INTS), dtype=np.int64) % 4
+CARD_PRIMES = np.array([Card.get_prime(card) for card in CARD_INTS], dtype=np.int64)
+CARD_RANK_BITS = np.left_shift(1, CARD_RANKS)
+
+NO_FLUSH = np.iinfo(np.int64).max
+
+# the five card subsets of 5, 6 and 7 cards
+FIVE_CARD_COMBOS = {size: np.array(list(itertools.combinations(range(size), 5)), dtype=np.int64)
+                    for size in (5, 6, 7)}
+
+
+def lookup_arrays(lookup):
+    # the mapped lookup already holds sorted arrays, the treys one is a dict
+    if hasattr(lookup, 'keys') and isinstance(lookup.keys, np.ndarray):
+        return np.asarray(lookup.keys), np.asarray(lookup.ranks)
+    return lookup_to_arrays(lookup)
+
+
+class BatchEvaluator:
+    """
+    Ranks (hands, cards) arrays of card ids with 5 to 7 cards each, the same values as treys.Evaluator.evaluate.
+    Without a flush a hand's rank only depends on its ranks, so the best five card rank of every rank multiset
+    is precomputed and found by binary search on the multiset's prime product.
+    Flushes index a table by the 13 bit rank mask of the flush suit, the hand takes the better of the two.
+    The arrays take about 1.3 MB in every process, get_batch_evaluator builds them once.
+    """
+
+    def __init__(self, table=None):
+        table = table or get_evaluator().table
+        flush_keys, flush_ranks = lookup_arrays(table.flush_lookup)
+        unsuited_keys, unsuited_ranks = lookup_arrays(table.unsuited_lookup)
+        flush_by_prime = dict(zip(flush_keys.tolist(), flush_ranks.tolist()))
+
+        # best flush of every mask of 5 to 7 ranks of one suit, NO_FLUSH for the rest
+        self.flush_ranks = np.full(1 << 13, NO_FLUSH, dtype=np.int64)
+        for size in (5, 6, 7):
+            for ranks in itertools.combinations(range(13), size):
+                mask = sum(1 << rank for rank in ranks)
+                if size == 5:
+                    self.flush_ranks[mask] = flush_by_prime[int(np.prod([Card.PRIMES[rank] for rank in ranks]))]
+                else:
+                    self.flush_ranks[mask] = min(self.flush_ranks[mask & ~(1 << rank)] for rank in ranks)
+
+        # best unsuited rank of every multiset of 5, 6 or 7 ranks, keyed by its prime product
+        self.multiset_keys = {}
+        self.multiset_ranks = {}
+        primes = np.array(Card.PRIMES, dtype=np.int64)
+        for size in FIVE_CARD_COMBOS:
+            multisets = np.array([ranks for ranks in itertools.combinations_with_replacement(range(13), size)
+                                  if max(ranks.count(rank) for rank in ranks) <= 4], dtype=np.int64)
+            subset_keys = primes[multisets[:, FIVE_CARD_COMBOS[size]]].prod(axis=-1)
+            best = unsuited_ranks[np.searchsorted(unsuited_keys, subset_keys)].min(axis=-1)
+            keys = primes[multisets].prod(axis=-1)
+            order = np.argsort(keys)
+            self.multiset_keys[size], self.multiset_ranks[size] = keys[order], best[order]
+
+    def evaluate(self, cards):
+        # (..., cards) card ids -> (...) ranks, lower is better
+        cards = np.asarray(cards, dtype=np.int64)
+        size = cards.shape[-1]
+        if size not in FIVE_CARD_COMBOS:
+            raise ValueError("hands must have 5 to 7 cards, got {}".format(size))
+        keys = self.multiset_keys[size]
+        index = np.minimum(np.searchsorted(keys, CARD_PRIMES[cards].prod(axis=-1)), len(keys) - 1)
+        ranks = self.multiset_ranks[size][index]
+        # the rank mask of each suit, ranks are unique within a suit so a sum is an or
+        suit_masks = np.stack([np.where(CARD_SUITS[cards] == suit, CARD_RANK_BITS[cards], 0).sum(axis=-1)
+                               for suit in range(4)], axis=-1)
+        return np.minimum(ranks, self.flush_ranks[suit_masks].min(axis=-1))
+
+
+_batch_evaluator = None
+_lock = threading.Lock()
+
+
+def get_batch_evaluator():
+    global _batch_evaluator
+    if _batch_evaluator is None:
+        with _lock:
+            if _batch_evaluator is None:
+                _batch_evaluator = BatchEvaluator()
+    return _batch_evaluator
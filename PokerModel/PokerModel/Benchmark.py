@@ -0,0 +1,261 @@
+import json
+import platform
+import os
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from .BatchEvaluator import get_batch_evaluator
+from .Cards import CARD_INTS
+from .Game import Game, get_other_player_action
+from .HandHistory import HandHistoryLogger, HandRecorder
+from .ModelRegistry import get_model
+from .ObservationEncoder import ObservationEncoder
+from .PokerEnv import PokerEnv
+from .SharedEvaluator import get_evaluator
+from .VecPokerEnv import VecPokerEnv
+
+# a metric got worse when it moved more than this fraction in its bad direction
+REGRESSION_THRESHOLD = 0.1
+# metrics where a larger value is better, every other metric is a time
+HIGHER_IS_BETTER = ('_per_second',)
+TEST_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+def percentiles(seconds):
+    seconds = np.asarray(seconds)
+    return {'p50_us': float(np.percentile(seconds, 50) * 1e6), 'p99_us': float(np.percentile(seconds, 99) * 1e6)}
+
+
+def played_envs(count, seed=0):
+    # seeded envs in varied states, for the benchmarks that need a position to look at
+    rng = np.random.default_rng(seed)
+    envs = []
+    for _ in range(count):
+        env = PokerEnv(rng=np.random.default_rng(rng.integers(1 << 32)))
+        for _ in range(rng.integers(4)):
+            turn = (env.player, env.opponent)
+            if not env.check_if_playable(*turn):
+                turn = turn[::-1]
+            done, _, _ = env.execute_player_action(*turn, int(rng.integers(1, 6)))
+            if done:
+                env.reset()
+        envs.append(env)
+    return envs
+
+
+def bench_env(actions, seed=0):
+    env = PokerEnv(rng=np.random.default_rng(seed))
+    choices = np.random.default_rng(seed + 1).integers(0, 6, actions).tolist()
+    hands = 0
+    started = time.perf_counter()
+    for action in choices:
+        if env.check_if_playable(env.player, env.opponent):
+            done, _, winning = env.execute_player_action(env.player, env.opponent, action)
+        else:
+            done, _, winning = env.execute_player_action(env.opponent, env.player, action)
+        hands += bool(winning)
+        if done:
+            env.reset()
+    seconds = time.perf_counter() - started
+    return {'actions_per_second': actions / seconds, 'hands_per_second': hands / seconds}
+
+
+def bench_vec_env(num_tables, steps, seed=0):
+    vec_env = VecPokerEnv(num_tables, seed=seed)
+    actions = np.random.default_rng(seed).integers(0, 6, (steps, num_tables))
+    hands = 0
+    started = time.perf_counter()
+    for step_actions in actions:
+        hands += int(vec_env.step(step_actions)[2].sum())
+    seconds = time.perf_counter() - started
+    return {'table_steps_per_second': steps * num_tables / seconds, 'hands_per_second': hands / seconds}
+
+
+def bench_encoder(rounds):
+    encoder = ObservationEncoder()
+    envs = played_envs(rounds)
+    started = time.perf_counter()
+    for env in envs:
+        encoder.encode(env, env.opponent, env.player)
+    seconds = time.perf_counter() - started
+    vec_env = VecPokerEnv(256)
+    seats = vec_env.current_player()
+    started = time.perf_counter()
+    for _ in range(100):
+        encoder.encode_tables(vec_env, seats)
+    table_seconds = (time.perf_counter() - started) / (100 * vec_env.num_tables)
+    return {'encode_us': seconds / rounds * 1e6, 'encode_tables_us_per_table': table_seconds * 1e6}
+
+
+def bench_showdowns(num_hands, seed=0):
+    # 7 card showdowns ranked in one batch, and one by one through treys
+    hands = np.argsort(np.random.default_rng(seed).random((num_hands, 52)), axis=1)[:, :7]
+    batch_evaluator = get_batch_evaluator()
+    started = time.perf_counter()
+    batch_evaluator.evaluate(hands)
+    batch_seconds = time.perf_counter() - started
+    evaluator = get_evaluator()
+    cards = [[CARD_INTS[card] for card in hand] for hand in hands.tolist()]
+    started = time.perf_counter()
+    for hand in cards:
+        evaluator.evaluate(hand[:2], hand[2:])
+    treys_seconds = time.perf_counter() - started
+    return {'batch_hands_per_second': num_hands / batch_seconds, 'treys_hands_per_second': num_hands / treys_seconds}
+
+
+def bench_hand_history(events):
+    # the cost of one logged action, on a throwaway log file
+    with tempfile.TemporaryDirectory() as directory:
+        logger = HandHistoryLogger(os.path.join(directory, 'hands.log'), flush_interval=60)
+        try:
+            recorder = HandRecorder(logger=logger)
+            started = time.perf_counter()
+            for _ in range(events):
+                recorder.action(0, 1, 10)
+            seconds = time.perf_counter() - started
+        finally:
+            logger.close()
+    return {'action_us': seconds / events * 1e6}
+
+
+def bench_snapshot(rounds):
+    envs = played_envs(rounds)
+    started = time.perf_counter()
+    snapshots = [env.to_bytes() for env in envs]
+    to_bytes_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    for data in snapshots:
+        PokerEnv.from_bytes(data)
+    from_bytes_seconds = time.perf_counter() - started
+    return {'to_bytes_us': to_bytes_seconds / rounds * 1e6, 'from_bytes_us': from_bytes_seconds / rounds * 1e6}
+
+
+def bench_decisions(rounds):
+    model = get_model()
+    rng = np.random.default_rng(0)
+    latencies = []
+    for env in played_envs(rounds):
+        started = time.perf_counter()
+        get_other_player_action(env, model, env.opponent, env.player, rng)
+        latencies.append(time.perf_counter() - started)
+    return percentiles(latencies)
+
+
+def bench_game_reset(rounds):
+    # the first reset of the process loads the model, the next ones only deal a new game
+    started = time.perf_counter()
+    Game().reset()
+    cold = time.perf_counter() - started
+    warm = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        Game().reset()
+        warm.append(time.perf_counter() - started)
+    return {'cold_ms': cold * 1e3, 'warm_p50_us': percentiles(warm)['p50_us']}
+
+
+def timed_request(send, *args):
+    started = time.perf_counter()
+    response = send(*args)
+    seconds = time.perf_counter() - started
+    if response.status_code != 200:
+        # an error page is fast, it must never be reported as a latency
+        raise RuntimeError("{} {} answered {}".format(send.__name__, args[0], response.status_code))
+    return seconds
+
+
+def bench_index_view(rounds):
+    # GET starts a game, every POST plays one action through the game store, on a throwaway test database
+    from django.test import Client, override_settings
+    from django.test.utils import setup_databases, setup_test_environment, teardown_databases, \
+        teardown_test_environment
+
+    setup_test_environment()
+    databases = setup_databases(verbosity=0, interactive=False)
+    # the manifest storage only knows collected files, static URLs are not what is measured
+    storages = override_settings(STORAGES=TEST_STORAGES)
+    storages.enable()
+    try:
+        client = Client()
+        gets, posts = [], []
+        for i in range(rounds):
+            gets.append(timed_request(client.get, '/'))
+            for action in ('CHECK_CALL', 'RAISE_POT', 'CHECK_CALL', 'CHECK_CALL'):
+                posts.append(timed_request(client.post, '/', {'action': action}))
+    finally:
+        storages.disable()
+        teardown_databases(databases, verbosity=0)
+        teardown_test_environment()
+    return {'get': percentiles(gets), 'post': percentiles(posts)}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(scale=1.0, web=True):
+    """
+    Runs every benchmark and returns the JSON ready report, scale multiplies the number of rounds.
+    Game.reset is measured first so its cold time includes loading the model.
+    """
+    rounds = max(int(1000 * scale), 10)
+    results = {'game_reset': bench_game_reset(rounds // 10)}
+    results['env'] = bench_env(rounds * 20)
+    results['vec_env'] = bench_vec_env(256, max(rounds // 5, 10))
+    results['encoder'] = bench_encoder(rounds)
+    results['snapshot'] = bench_snapshot(rounds)
+    results['showdown'] = bench_showdowns(rounds * 20)
+    results['hand_history'] = bench_hand_history(rounds * 20)
+    results['decision'] = bench_decisions(rounds)
+    if web:
+        results['index_view'] = bench_index_view(max(rounds // 20, 5))
+    return {
+        'commit': git_commit(),
+        'time': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'results': results,
+    }
+
+
+def flatten(results, prefix=''):
+    metrics = {}
+    for name, value in results.items():
+        if isinstance(value, dict):
+            metrics.update(flatten(value, prefix + name + '.'))
+        else:
+            metrics[prefix + name] = value
+    return metrics
+
+
+def compare(report, baseline, threshold=REGRESSION_THRESHOLD):
+    # (metric, baseline value, new value, relative change, regressed) of every metric both reports have
+    new_metrics, old_metrics = flatten(report['results']), flatten(baseline['results'])
+    changes = []
+    for metric in sorted(new_metrics.keys() & old_metrics.keys()):
+        old, new = old_metrics[metric], new_metrics[metric]
+        change = (new - old) / old if old else 0.0
+        worse = -change if metric.endswith(HIGHER_IS_BETTER) else change
+        changes.append((metric, old, new, change, worse > threshold))
+    return changes
+
+
+def save_report(path, report):
+    with open(path, 'w') as report_file:
+        json.dump(report, report_file, indent=2)
+
+
+def load_report(path):
+    with open(path) as report_file:
+        return json.load(report_file)
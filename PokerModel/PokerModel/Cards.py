@@ -0,0 +1,98 @@
+from random import Random
+
+import numpy as np
+from treys import Card, Deck
+
+# Compact card ids: id = rank * 4 + suit, ranks 2..A -> 0..12, suits in treys order (s, h, d, c)
+NUM_CARDS = 52
+NO_CARD = 0xFF
+
+CARD_INTS = tuple(Deck.GetFullDeck())
+CARD_IDS = {card: card_id for card_id, card in enumerate(CARD_INTS)}
+
+# (value, colour) of every card id: ace=1, 2..10, jack=11, queen=12, king=13 and hearts=1, diamonds=2, clubs=3, spades=4
+CARD_VALUES = {'T': 10, 'J': 11, 'Q': 12, 'K': 13, 'A': 1}
+CARD_COLOURS = {'h': 1, 'd': 2, 'c': 3, 's': 4}
+IMAGE_VALUES = {'T': '10', 'J': 'jack', 'Q': 'queen', 'K': 'king', 'A': 'ace'}
+IMAGE_SUITS = {'h': 'hearts', 'd': 'diamonds', 'c': 'clubs', 's': 'spades'}
+
+
+def card_features(card):
+    value, colour = Card.int_to_str(card)
+    return CARD_VALUES.get(value) or int(value), CARD_COLOURS[colour]
+
+
+def card_image_file(card):
+    value, colour = Card.int_to_str(card)
+    return "Images/{}_of_{}.png".format(IMAGE_VALUES.get(value, value), IMAGE_SUITS[colour])
+
+
+CARD_FEATURES = np.array([card_features(card) for card in CARD_INTS], dtype=np.int64)
+CARD_FEATURES.flags.writeable = False
+CARD_IMAGE_FILES = tuple(card_image_file(card) for card in CARD_INTS)
+COVER_IMAGE_FILE = "Images/cover.png"
+
+
+def cards_to_ids(cards):
+    return [CARD_IDS[card] for card in cards]
+
+
+def ids_to_cards(card_ids):
+    return [CARD_INTS[card_id] for card_id in card_ids]
+
+
+# treys only uses a deck's Random to shuffle, decks built here share one instead of seeding a new one each hand
+_DECK_RANDOM = Random()
+
+
+def make_deck(cards):
+    # treys Deck holding exactly these cards, treys draws from the end of the list
+    deck = Deck.__new__(Deck)
+    deck._random = _DECK_RANDOM
+    deck.cards = cards
+    return deck
+
+
+def deck_from_order(order):
+    # order lists card ids in the order they are drawn
+    return make_deck([CARD_INTS[card_id] for card_id in order[::-1]])
+
+
+# seeded decks are drawn this many at a time, PokerEnv and VecPokerEnv deal the same decks from the same generator
+DECK_BATCH = 32
+
+
+def draw_orders(rng, count=DECK_BATCH):
+    # count shuffled card id orders from one call of the generator, as uint8 rows
+    return np.argsort(rng.random((count, NUM_CARDS)), axis=1).astype(np.uint8)
+
+
+class DeckStream:
+    """
+    The shuffled decks of one numpy Generator, DECK_BATCH orders are drawn at once and handed out one by one.
+    The stream pickles with the orders it has not dealt yet, so a restored game deals the same cards.
+    """
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.orders = None
+        self.next_order = DECK_BATCH
+
+    def order(self):
+        if self.next_order == DECK_BATCH:
+            self.orders = draw_orders(self.rng).tolist()
+            self.next_order = 0
+        self.next_order += 1
+        return self.orders[self.next_order - 1]
+
+    def deck(self):
+        return deck_from_order(self.order())
+
+
+def cards_to_image_files(cards, number_of_cards=2, show_cards=True):
+    # static image of every card, padded with covers up to number_of_cards
+    if show_cards:
+        file_names = [CARD_IMAGE_FILES[CARD_IDS[card]] for card in cards]
+    else:
+        file_names = [COVER_IMAGE_FILE] * len(cards)
+    return file_names + [COVER_IMAGE_FILE] * (number_of_cards - len(cards))
@@ -1,95 +1,39 @@
 from .PokerEnv import *
-import tensorflow as tf
-from tensorflow import keras
+from .ModelRegistry import get_model
+from .InferenceServer import InferenceServer, get_agent_model
+from .ObservationEncoder import get_encoder
+from .Cards import cards_to_image_files
+from .HandHistory import create_recorder
+from .Replay import create_rngs
+from .Metrics import timed
 import numpy as np
 
 
-def get_other_player_action(pokerEnv, model, cards_dictionary, cur_player, other_player):
-    valid_actions = pokerEnv.get_player_valid_actions(other_player=other_player)
+@timed('agent_action', "Agent decisions (encoding, inference and sampling)")
+def get_other_player_action(pokerEnv, model, cur_player, other_player, rng=None):
+    valid_actions = np.flatnonzero(pokerEnv.legal_actions(cur_player, other_player) != ILLEGAL)
     # return np.random.choice(valid_actions)
-    observation = get_observation(pokerEnv, cards_dictionary,  cur_player, other_player)
-    other_player_observation = np.array([observation.reshape(1, -1)])
-    q_values = model(tf.expand_dims(tf.expand_dims(tf.convert_to_tensor(observation), 0), 0))
-    q_values = q_values[0].numpy()
+    observation = get_observation(pokerEnv, cur_player, other_player)
+    q_values = get_q_values(model, observation)
     q_values = q_values[valid_actions]
     # Choose action with highest Q-value among valid actions
     e_x = np.exp(q_values - np.max(q_values))  # need fix
     softmax_dist = e_x / e_x.sum(axis=0)
     softmax_dist = np.nan_to_num(softmax_dist)
-    action = np.random.choice(valid_actions, 1, p=softmax_dist)[0]
+    # rng is an optional numpy Generator, the global np.random state is used without it
+    action = (np.random if rng is None else rng).choice(valid_actions, 1, p=softmax_dist)[0]
     return action
 
-def get_observation(pokerEnv,cards_dictionary, cur_player, other_player):
-    # Convert the player's hand into one-hot encoded representation
-    hand_observation = get_cards_representation(cards_dictionary, cur_player.get_hand(), 2)
-
-    # Convert the player's hand into one-hot encoded representation
-    positions_observation = get_position_representation(cur_player, other_player)
-
-    # Convert the community cards into one-hot encoded representation
-    community_cards_observation = get_cards_representation(cards_dictionary, pokerEnv.community_cards, 5)
-
-    # Normalize the amount to call
-    call_observation = np.array((other_player.total_bet - cur_player.total_bet) / INITIAL_STACK_SIZE)
-
-    # Normalize the pot size
-    pot_size_observation = np.array([pokerEnv.pot / INITIAL_STACK_SIZE * 2])
-
-    # Normalize the stack sizes for both players
-    stack_sizes_observation = np.array(
-        [cur_player.stack_size / (INITIAL_STACK_SIZE * 2), other_player.stack_size / (INITIAL_STACK_SIZE * 2)])
-
-    # Combine the different parts of the observation into a tuple
-    observation = (
-        hand_observation,
-        positions_observation,
-        community_cards_observation,
-        pot_size_observation,
-        stack_sizes_observation,
-        call_observation,
-    )
-    return convert_observation_to_input(observation)
-
-def get_position_representation(cur_player, other_player):
-    position_representation = np.zeros((2, 5), dtype=np.float32)
-    position_representation[0, cur_player.position.value] = 1
-    position_representation[0, other_player.position.value] = 1
-    return position_representation
-
-def get_cards_representation(cards_dictionary, cur_cards, mum_of_cards):
-    card_representation = np.zeros((mum_of_cards, 17), dtype=np.float32)
-    for i, card in enumerate(cur_cards):
-        card_representation[i, cards_dictionary[card][0] - 1] = 1
-        card_representation[i, 13 + cards_dictionary[card][1] - 1] = 1
-    return card_representation
-
-def convert_observation_to_input(observation):
-    temp_array = np.array([])
-    for obs in observation:
-        temp_array = np.hstack([temp_array, obs.flatten()])
-    return temp_array
-
-def create_cards_dictionary():
-    chars = ["h", "d", "c", "s"]
-    nums = [str(x) for x in range(2, 10)] + ["T", "J", "Q", "K", "A"]
-    index = 0
-    dictionary = {}
-    for n in nums:
-        for c in chars:
-            combo = n + c
-            dictionary[Card.new(combo)] = (index, combo)
-            index += 1
-    final_dic = {}
-    auxiliary_dic = {"T":10, "J":11, "Q":12, "K":13, "A":1,"h":1, "d":2, "c":3, "s":4}
-    for num_key, tup in dictionary.items():
-        card_value = tup[1][0]
-        if card_value in auxiliary_dic:
-            card_value = auxiliary_dic[card_value]
-        card_colour = auxiliary_dic[tup[1][1]]
-        final_dic[num_key] = (int(card_value), card_colour)
-    return final_dic
-
+def get_q_values(model, observation):
+    if isinstance(model, InferenceServer):
+        return model.predict(observation)
+    # works for the NumPy runtime and for a Keras model alike
+    q_values = model(observation[np.newaxis, np.newaxis, :])
+    return np.asarray(q_values)[0]
 
+def get_observation(pokerEnv, cur_player, other_player):
+    # float32 observation written into this thread's encoder buffer, overwritten by the next call
+    return get_encoder().encode(pokerEnv, cur_player, other_player)
 
 class Game:
 
@@ -102,19 +46,50 @@ class Game:
     def __init__(self):
         self.env = None
         self.agent_model = None
-        self.image_dictionary = {"♦": "diamonds", "♠": "spades", "♣": "clubs", "♥": "hearts", "T": "10",
-                                 "J": "jack", "Q": "queen", "K": "king", "A": "ace"}
         self.done = None
         self.agent_action = None
         self.player_action = None
         self.winner = None
         self.show_opponent_cards = None
-
-
-    def reset(self):
-        self.env = PokerEnv()
-        self.agent_model = keras.models.load_model('static/model.h5')
-        self.cards_dictionary = create_cards_dictionary()
+        self.seed = None
+        self.decks = None
+        self.agent_rng = None
+        # every action executed in this game, both seats, see Replay.replay
+        self.actions = None
+
+    def __getstate__(self):
+        # the agent model is shared by the process, never serialize it with the game
+        state = self.__dict__.copy()
+        state['agent_model'] = None
+        if self.env is not None:
+            state['env'] = self.env.to_bytes()
+            # the snapshot has no room for the history hook, it travels next to it
+            state['history'] = self.env.history
+        return state
+
+    def __setstate__(self, state):
+        history = state.pop('history', None)
+        if 'deck_rng' in state:
+            # pickled before decks were dealt in batches
+            deck_rng = state.pop('deck_rng')
+            state['decks'] = None if deck_rng is None else DeckStream(deck_rng)
+        self.__dict__.update(state)
+        if self.env is not None:
+            self.env = PokerEnv.from_bytes(self.env)
+            self.env.history = history
+            self.env.decks = self.decks
+            self.agent_model = get_agent_model()
+
+    @timed('game_reset', "Game.reset")
+    def reset(self, seed=None):
+        # the same seed and the same player actions give the same game
+        self.seed = seed
+        deck_rng, self.agent_rng = create_rngs(seed)
+        # the env and the game share the stream, so a pickled game keeps the decks it has not dealt yet
+        self.decks = DeckStream(deck_rng)
+        self.actions = bytearray()
+        self.env = PokerEnv(rng=self.decks, history=create_recorder())
+        self.agent_model = get_agent_model()
         self.done = False
         self.agent_action = ""
         self.player_action = ""
@@ -133,20 +108,42 @@ class Game:
     #     agent_action = ""
     #     done, action_taken, _ = self.env.execute_player_action(self.env.player, self.env.opponent, player_action)
     #     if not done:
-    #         agent_action = get_other_player_action(self.env, self.agent_model, self.cards_dictionary,
+    #         agent_action = get_other_player_action(self.env, self.agent_model,
     #                                                self.env.opponent, self.env.player)
     #         done, agent_action, _ = self.env.execute_player_action(self.env.opponent, self.env.player, agent_action)
     #     self.agent_action = agent_action
     #     self.done = done
     #     return self.create_context()
 
+    @timed('game_step', "Game.step")
     def step(self, player_action):
+        # advances the seat to act by one action, player_action is ignored on the agent's turn
         if self.is_player_turn():
+            if player_action is None:
+                # the player is to act and there is no action to play
+                return None
+            self.actions.append(player_action)
             self.done, self.player_action, self.winner = self.env.execute_player_action(self.env.player, self.env.opponent, player_action)
+            return {"actor": "player", "action": self.player_action, "hand_over": bool(self.winner)}
         else:
-            agent_action = get_other_player_action(self.env, self.agent_model, self.cards_dictionary,
-                                                   self.env.opponent, self.env.player)
+            agent_action = get_other_player_action(self.env, self.agent_model,
+                                                   self.env.opponent, self.env.player, self.agent_rng)
+            self.actions.append(agent_action)
             self.done, self.agent_action, self.winner = self.env.execute_player_action(self.env.opponent, self.env.player, agent_action)
+            return {"actor": "agent", "action": self.agent_action, "hand_over": bool(self.winner)}
+
+    def step_until_player_turn(self, player_action=None):
+        """
+        Plays player_action, then every agent decision, board deal and new hand until the player must act
+        again or the game is over. Returns the events of every step in order.
+        Without player_action, or when it is not the player's turn, only the pending agent decisions are played.
+        """
+        events = []
+        if player_action is not None and not self.done and self.is_player_turn():
+            events.append(self.step(player_action))
+        while not self.done and not self.is_player_turn():
+            events.append(self.step(None))
+        return events
 
     def is_player_turn(self):
         if self.env.check_if_playable(self.env.player, self.env.opponent):
@@ -156,25 +153,31 @@ class Game:
 
     def create_context(self):
         context = {
-            "player_cards": self.cards_str_to_image_files(self.env.cards_print(self.env.player.hand)),
+            "player_cards": cards_to_image_files(self.env.player.hand),
             "player_stack": self.env.player.stack_size,
             "player_bet": self.env.player.total_bet,
             "player_position": self.env.player.position.name,
             "opponent_stack": self.env.opponent.stack_size,
             "opponent_position": self.env.opponent.position.name,
             "opponent_bet": self.env.opponent.total_bet,
-            "opponent_cards": self.cards_str_to_image_files(self.env.cards_print(self.env.opponent.hand),
-                                                            show_cards=self.show_opponent_cards),
+            "opponent_cards": cards_to_image_files(self.env.opponent.hand, show_cards=self.show_opponent_cards),
             "opponent_action": self.agent_action,
-            "community_cards": self.cards_str_to_image_files(self.env.cards_print(self.env.community_cards), 5),
+            "community_cards": cards_to_image_files(self.env.community_cards, 5),
             "done": self.done,
             "pot_size": self.env.pot,
             "player_turn": self.is_player_turn(),
+            # the chips of every player action, ILLEGAL disables its button
+            "legal_actions": self.get_player_legal_actions(),
             "winner": self.winner,
             "show_opponent_cards": self.show_opponent_cards
         }
         return context
 
+    def get_player_legal_actions(self):
+        if self.done or not self.is_player_turn():
+            return [ILLEGAL] * len(Action)
+        return self.env.action_amounts(self.env.player, self.env.opponent)
+
     def get_card_images(self):
         pass
 
@@ -184,32 +187,10 @@ class Game:
         else:
             return "opponent"
 
-    def cards_str_to_image_files(self, cards_str, number_of_cards=2, show_cards=True):
-        cards = cards_str.split(',')
-        cards = [card.replace('[', '').replace(']', '') for card in cards]
-        if len(cards) < 2:
-            cards = []
-        file_names = []
-        for card in cards:
-            color = card[-1]
-            val = card[:-1]
-            color_str = self.image_dictionary[color]
-            value_str = self.image_dictionary.get(val)
-            if value_str is None:
-                value_str = val
-            if show_cards:
-                file_names.append("Images/" + value_str + "_of_" + color_str + ".png")
-            else:
-                file_names.append("Images/cover.png")
-        for i in range(number_of_cards - len(cards)):
-            file_names.append("Images/cover.png")
-        return file_names
-
 
 def play_game():
     env = PokerEnv()
-    agent_model = keras.models.load_model('static/model.h5')
-    cards_dictionary = create_cards_dictionary()
+    agent_model = get_model()
 
     done = False
     print(env.full_print())
@@ -226,7 +207,7 @@ def play_game():
         done, action_taken,  = env.execute_player_action(env.player, env.opponent, player_action)
         print("player move:" + action_taken)
         if not done:
-            agent_action = get_other_player_action(env, agent_model, cards_dictionary, env.opponent, env.player)
+            agent_action = get_other_player_action(env, agent_model, env.opponent, env.player)
             done, action_taken, _ = env.execute_player_action(env.opponent, env.player, agent_action)
             print("agent move:" + action_taken)
             print(env.full_print())
@@ -0,0 +1,180 @@
+import atexit
+import os
+import random
+import struct
+import threading
+from collections import deque, namedtuple
+
+from .Cards import CARD_IDS, CARD_INTS
+
+# the hand history is off unless a log file is configured
+HAND_HISTORY_PATH = os.environ.get('POKER_HAND_HISTORY', '')
+# seconds between two writes of the buffered events, and the number of events that triggers a write sooner
+FLUSH_INTERVAL = float(os.environ.get('POKER_HAND_HISTORY_FLUSH_S', 1.0))
+FLUSH_EVENTS = 4096
+
+# Every event is a length byte followed by the header and its body, events of different tables interleave
+# and are tied to their hand by (table id, hand number).
+HEADER = struct.Struct('<BQI')
+HAND_START = 0
+ACTION = 1
+COMMUNITY_CARDS = 2
+HAND_END = 3
+# player stack, opponent stack (both before the blinds), player is small blind, hole cards (player then opponent)
+START_BODY = struct.Struct('<iiB4B')
+# seat (0 player, 1 opponent), action, pot after the action
+ACTION_BODY = struct.Struct('<BBi')
+# winner seat, showdown, pot
+END_BODY = struct.Struct('<BBi')
+
+PLAYER_SEAT = 0
+OPPONENT_SEAT = 1
+
+Event = namedtuple('Event', ['kind', 'table_id', 'hand_number', 'data'])
+Hand = namedtuple('Hand', ['table_id', 'hand_number', 'stacks', 'player_small_blind', 'hole_cards',
+                           'community_cards', 'actions', 'winner', 'showdown', 'pot'])
+
+
+class HandHistoryLogger:
+    """
+    Buffers encoded events in memory and appends them to the log file from a background thread,
+    logging an event is a deque append and never waits on the disk.
+    """
+
+    def __init__(self, path, flush_interval=FLUSH_INTERVAL, flush_events=FLUSH_EVENTS):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_events = flush_events
+        self.events = deque()
+        self.file = open(path, 'ab')
+        self.file_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = False
+        self.thread = threading.Thread(target=self.run, name='hand-history', daemon=True)
+        self.thread.start()
+
+    def log(self, event):
+        self.events.append(event)
+        if len(self.events) >= self.flush_events:
+            self.wakeup.set()
+
+    def run(self):
+        while not self.stopped:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        with self.file_lock:
+            if self.file.closed:
+                return
+            count = len(self.events)
+            if count:
+                self.file.write(b''.join([self.events.popleft() for _ in range(count)]))
+                self.file.flush()
+
+    def close(self):
+        self.stopped = True
+        self.wakeup.set()
+        self.thread.join()
+        self.flush()
+        with self.file_lock:
+            self.file.close()
+
+
+_logger = None
+_lock = threading.Lock()
+
+
+def get_hand_logger():
+    global _logger
+    if _logger is None:
+        with _lock:
+            if _logger is None:
+                _logger = HandHistoryLogger(HAND_HISTORY_PATH)
+                atexit.register(_logger.close)
+    return _logger
+
+
+class HandRecorder:
+    """
+    The history hook of one table (PokerEnv.history), it only keeps the table id and the hand number,
+    so it survives pickling with the game.
+    """
+
+    def __init__(self, table_id=None, logger=None):
+        self.table_id = random.getrandbits(63) if table_id is None else table_id
+        self.hand_number = 0
+        self.logger = logger
+
+    def __getstate__(self):
+        return self.table_id, self.hand_number
+
+    def __setstate__(self, state):
+        self.table_id, self.hand_number = state
+        self.logger = None
+
+    def log(self, kind, body):
+        event = HEADER.pack(kind, self.table_id, self.hand_number) + body
+        (self.logger or get_hand_logger()).log(bytes((len(event),)) + event)
+
+    def start_hand(self, env):
+        self.hand_number += 1
+        player, opponent = env.player, env.opponent
+        self.log(HAND_START, START_BODY.pack(player.stack_size + player.total_bet,
+                                             opponent.stack_size + opponent.total_bet, player.is_small_blind,
+                                             *[CARD_IDS[card] for card in player.hand + opponent.hand]))
+
+    def action(self, seat, action, pot):
+        self.log(ACTION, ACTION_BODY.pack(seat, action, pot))
+
+    def community_cards(self, cards):
+        self.log(COMMUNITY_CARDS, bytes(CARD_IDS[card] for card in cards))
+
+    def end_hand(self, winner, showdown, pot):
+        self.log(HAND_END, END_BODY.pack(winner, showdown, pot))
+
+
+def create_recorder():
+    # the history hook new games get, None when the hand history is off
+    if HAND_HISTORY_PATH:
+        return HandRecorder()
+    return None
+
+
+def read_events(path, chunk_size=1 << 16):
+    # decodes the log lazily, chunk by chunk, a partly written last event is left out
+    with open(path, 'rb') as log_file:
+        data = b''
+        while True:
+            chunk = log_file.read(chunk_size)
+            if not chunk:
+                return
+            data += chunk
+            offset = 0
+            while offset < len(data) and offset + 1 + data[offset] <= len(data):
+                end = offset + 1 + data[offset]
+                kind, table_id, hand_number = HEADER.unpack_from(data, offset + 1)
+                yield Event(kind, table_id, hand_number, data[offset + 1 + HEADER.size:end])
+                offset = end
+            data = data[offset:]
+
+
+def read_hands(path):
+    # every complete hand, yielded when its last event is read, hands still open at the end are left out
+    hands = {}
+    for event in read_events(path):
+        key = event.table_id, event.hand_number
+        if event.kind == HAND_START:
+            player_stack, opponent_stack, player_small_blind, *hole_cards = START_BODY.unpack(event.data)
+            hands[key] = ((player_stack, opponent_stack), bool(player_small_blind),
+                          [CARD_INTS[card] for card in hole_cards], [], [])
+        elif key not in hands:
+            continue
+        elif event.kind == ACTION:
+            hands[key][4].append(ACTION_BODY.unpack(event.data))
+        elif event.kind == COMMUNITY_CARDS:
+            hands[key][3].extend(CARD_INTS[card] for card in event.data)
+        elif event.kind == HAND_END:
+            winner, showdown, pot = END_BODY.unpack(event.data)
+            yield Hand(*key, *hands.pop(key), winner, bool(showdown), pot)
@@ -0,0 +1,130 @@
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+from .BatchEvaluator import CARD_PRIMES, CARD_RANK_BITS, CARD_SUITS, get_batch_evaluator
+from .Cards import CARD_IDS
+
+PLAYER_SEAT = 0
+OPPONENT_SEAT = 1
+
+# rank masks of the ten straights, wheel first
+STRAIGHT_MASKS = np.array([0b1000000001111] + [0b11111 << low for low in range(9)], dtype=np.int64)
+
+# flush_draw: four cards of one suit, straight_outs: number of ranks that would complete a straight
+Draws = namedtuple('Draws', ['flush_draw', 'straight_outs'])
+NO_DRAWS = Draws(False, 0)
+
+# per card id, as python ints so the updates never touch numpy
+_PRIMES = CARD_PRIMES.tolist()
+_SUITS = CARD_SUITS.tolist()
+_RANK_BITS = CARD_RANK_BITS.tolist()
+
+
+class HandTables:
+    """
+    The lookups of the incremental hand state, built from the batch evaluator tables:
+    the best unsuited rank of every 5 to 7 card rank multiset by prime product (a product is only
+    shared by equal multisets, so one dict covers every size), the best flush of every suit rank mask
+    and the number of straight completing ranks of every rank mask.
+    They are python dicts and lists, about 7.4 MB in every process, built once by get_hand_tables.
+    A memory-mapped array would be shared between workers but every street would pay a numpy lookup.
+    """
+
+    def __init__(self, batch_evaluator=None):
+        batch_evaluator = batch_evaluator or get_batch_evaluator()
+        self.unsuited_ranks = {}
+        for size, keys in batch_evaluator.multiset_keys.items():
+            self.unsuited_ranks.update(zip(keys.tolist(), batch_evaluator.multiset_ranks[size].tolist()))
+        self.flush_ranks = batch_evaluator.flush_ranks.tolist()
+        masks = np.arange(1 << 13, dtype=np.int64)
+        straight = ((masks[:, np.newaxis] & STRAIGHT_MASKS) == STRAIGHT_MASKS).any(axis=1)
+        outs = np.zeros(len(masks), dtype=np.int64)
+        for rank in range(13):
+            outs += ~straight & straight[masks | (1 << rank)] & (masks & (1 << rank) == 0)
+        self.straight_outs = outs.tolist()
+
+
+_tables = None
+_lock = threading.Lock()
+
+
+def get_hand_tables():
+    global _tables
+    if _tables is None:
+        with _lock:
+            if _tables is None:
+                _tables = HandTables()
+    return _tables
+
+
+class HandState:
+    """
+    Best hand rank and draws of both seats of one hand, kept up to date card by card as the board is dealt.
+    Every card multiplies a running prime product and sets a bit in its suit mask, so a new street costs
+    one dict read and four list reads per seat instead of a fresh evaluation.
+    The ranks of every street are kept, so earlier streets stay readable until the hand ends.
+    """
+
+    def __init__(self, player_hand, opponent_hand, board=()):
+        self.tables = get_hand_tables()
+        self.products = [1, 1]
+        self.suit_masks = [[0] * 4, [0] * 4]
+        # board size -> (player rank, opponent rank), lower is better
+        self.street_ranks = {}
+        self.add_cards(PLAYER_SEAT, player_hand)
+        self.add_cards(OPPONENT_SEAT, opponent_hand)
+        # cards each seat holds, hole cards and board together
+        self.card_count = len(player_hand)
+        self.add_board_cards(board)
+
+    def __getstate__(self):
+        # the tables are shared by the process
+        state = self.__dict__.copy()
+        del state['tables']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.tables = get_hand_tables()
+
+    def add_cards(self, seat, cards):
+        masks = self.suit_masks[seat]
+        for card in cards:
+            card_id = CARD_IDS[card]
+            self.products[seat] *= _PRIMES[card_id]
+            masks[_SUITS[card_id]] |= _RANK_BITS[card_id]
+
+    def add_board_cards(self, cards):
+        if not cards:
+            return
+        self.add_cards(PLAYER_SEAT, cards)
+        self.add_cards(OPPONENT_SEAT, cards)
+        self.card_count += len(cards)
+        if self.card_count >= 5:
+            self.street_ranks[self.card_count - 2] = (self.evaluate(PLAYER_SEAT), self.evaluate(OPPONENT_SEAT))
+
+    def evaluate(self, seat):
+        # suits without a flush read NO_FLUSH, which never wins the min
+        flush_ranks = self.tables.flush_ranks
+        masks = self.suit_masks[seat]
+        return min(self.tables.unsuited_ranks[self.products[seat]], flush_ranks[masks[0]], flush_ranks[masks[1]],
+                   flush_ranks[masks[2]], flush_ranks[masks[3]])
+
+    @property
+    def ranks(self):
+        # (player rank, opponent rank) on the current board, None before the flop
+        return self.street_ranks.get(self.card_count - 2)
+
+    def rank(self, seat, board_size=None):
+        ranks = self.street_ranks.get(self.card_count - 2 if board_size is None else board_size)
+        return None if ranks is None else ranks[seat]
+
+    def draws(self, seat):
+        # draws only mean something while cards are still to come
+        if self.card_count >= 7:
+            return NO_DRAWS
+        masks = self.suit_masks[seat]
+        flush_draw = any(bin(mask).count('1') == 4 for mask in masks)
+        return Draws(flush_draw, self.tables.straight_outs[masks[0] | masks[1] | masks[2] | masks[3]])
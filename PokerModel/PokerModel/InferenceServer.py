@@ -0,0 +1,143 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+from .Metrics import register_collector
+from .ModelRegistry import get_model
+
+INFERENCE_BATCHING = os.environ.get('POKER_INFERENCE_BATCHING', '0') == '1'
+MAX_BATCH_SIZE = int(os.environ.get('POKER_MAX_BATCH_SIZE', 64))
+MAX_WAIT = float(os.environ.get('POKER_MAX_BATCH_WAIT_MS', 2)) / 1000
+# number of recent batches and requests kept for the metrics
+METRICS_WINDOW = 1000
+
+_STOP = object()
+
+
+class InferenceServer:
+    """
+    Collects agent decisions from every table of the worker and answers them with one batched forward pass.
+    A batch is sent when it reaches max_batch_size or when its oldest request waited max_wait seconds.
+    """
+
+    def __init__(self, model_getter=get_model, max_batch_size=MAX_BATCH_SIZE, max_wait=MAX_WAIT):
+        self.model_getter = model_getter
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.batch_sizes = deque(maxlen=METRICS_WINDOW)
+        self.queue_latencies = deque(maxlen=METRICS_WINDOW)
+        self.total_batches = 0
+        self.total_requests = 0
+        self.metrics_lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, name='inference-server', daemon=True)
+        self.thread.start()
+
+    def submit(self, observation):
+        future = Future()
+        self.requests.put((observation, future, time.perf_counter()))
+        return future
+
+    def predict(self, observation):
+        # q-values of a single observation, blocks until its batch is done
+        return self.submit(observation).result()
+
+    def stop(self):
+        self.requests.put(_STOP)
+        self.thread.join()
+
+    def next_batch(self):
+        first = self.requests.get()
+        if first is _STOP:
+            return None
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                request = self.requests.get(timeout=timeout) if timeout > 0 else self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is _STOP:
+                self.requests.put(_STOP)
+                break
+            batch.append(request)
+        return batch
+
+    def run(self):
+        while True:
+            batch = self.next_batch()
+            if batch is None:
+                return
+            started = time.perf_counter()
+            observations = np.stack([observation for observation, _, _ in batch]).astype(np.float32)
+            try:
+                q_values = np.asarray(self.model_getter()(observations[:, np.newaxis, :]))
+            except Exception as error:
+                for _, future, _ in batch:
+                    future.set_exception(error)
+                continue
+            for i, (_, future, _) in enumerate(batch):
+                future.set_result(q_values[i])
+            with self.metrics_lock:
+                self.batch_sizes.append(len(batch))
+                self.queue_latencies.extend(started - submitted for _, _, submitted in batch)
+                self.total_batches += 1
+                self.total_requests += len(batch)
+
+    def metrics(self):
+        with self.metrics_lock:
+            batch_sizes = np.array(self.batch_sizes)
+            latencies = np.array(self.queue_latencies)
+        return {
+            "batches": self.total_batches,
+            "requests": self.total_requests,
+            "batch_size_mean": float(batch_sizes.mean()) if len(batch_sizes) else 0.0,
+            "batch_size_max": int(batch_sizes.max()) if len(batch_sizes) else 0,
+            "queue_latency_p50": float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+            "queue_latency_p99": float(np.percentile(latencies, 99)) if len(latencies) else 0.0,
+        }
+
+
+_server = None
+_lock = threading.Lock()
+
+
+def get_inference_server():
+    global _server
+    if _server is None:
+        with _lock:
+            if _server is None:
+                _server = InferenceServer()
+    return _server
+
+
+def get_agent_model():
+    # what games call for q-values: the shared batching server when enabled, otherwise the shared model
+    if INFERENCE_BATCHING:
+        return get_inference_server()
+    return get_model()
+
+
+def inference_metrics():
+    if _server is None:
+        return []
+    metrics = _server.metrics()
+    return [
+        ('inference_batches_total', 'counter', "Batched forward passes", metrics['batches']),
+        ('inference_requests_total', 'counter', "Decisions answered by the inference server", metrics['requests']),
+        ('inference_batch_size_mean', 'gauge', "Mean size of the recent batches", metrics['batch_size_mean']),
+        ('inference_batch_size_max', 'gauge', "Largest recent batch", metrics['batch_size_max']),
+        ('inference_queue_latency_p50_seconds', 'gauge', "Median wait of the recent requests",
+         metrics['queue_latency_p50']),
+        ('inference_queue_latency_p99_seconds', 'gauge', "99th percentile wait of the recent requests",
+         metrics['queue_latency_p99']),
+    ]
+
+
+register_collector(inference_metrics)
@@ -0,0 +1,127 @@
+import asyncio
+import bisect
+import functools
+import os
+import random
+import threading
+import time
+
+# with POKER_METRICS=0 timed() returns the functions untouched, nothing is measured or exposed
+METRICS_ENABLED = os.environ.get('POKER_METRICS', '1') == '1'
+# fraction of the calls that are timed, every call is counted
+SAMPLE_RATE = float(os.environ.get('POKER_METRICS_SAMPLE_RATE', 0.1))
+PREFIX = 'poker_'
+# histogram upper bounds in seconds
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def render(self):
+        return ["# HELP {} {}".format(self.name, self.help_text), "# TYPE {} counter".format(self.name),
+                "{} {}".format(self.name, self.value)]
+
+
+class Histogram:
+
+    def __init__(self, name, help_text, buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        # one count per bucket plus the +Inf one, not cumulative until rendered
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def render(self):
+        with self.lock:
+            counts, total = list(self.counts), self.sum
+        lines = ["# HELP {} {}".format(self.name, self.help_text), "# TYPE {} histogram".format(self.name)]
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), counts):
+            cumulative += count
+            lines.append('{}_bucket{{le="{}"}} {}'.format(self.name, bound, cumulative))
+        lines.append("{}_sum {}".format(self.name, total))
+        lines.append("{}_count {}".format(self.name, cumulative))
+        return lines
+
+
+_metrics = {}
+_collectors = []
+_lock = threading.Lock()
+
+
+def get_metric(cls, name, help_text):
+    with _lock:
+        if name not in _metrics:
+            _metrics[name] = cls(name, help_text)
+        return _metrics[name]
+
+
+def register_collector(collector):
+    # collector() returns (name, type, help, value) tuples read when the metrics are rendered
+    _collectors.append(collector)
+
+
+def timed(name, help_text, sample_rate=None):
+    # counts every call of the decorated function (or coroutine function) and times a sample_rate share of them
+    def decorate(function):
+        if not METRICS_ENABLED:
+            return function
+        calls = get_metric(Counter, PREFIX + name + '_calls_total', help_text + ", calls")
+        seconds = get_metric(Histogram, PREFIX + name + '_seconds', help_text + ", sampled duration")
+        rate = SAMPLE_RATE if sample_rate is None else sample_rate
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            calls.inc()
+            if random.random() >= rate:
+                return function(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                seconds.observe(time.perf_counter() - started)
+
+        @functools.wraps(function)
+        async def async_wrapper(*args, **kwargs):
+            calls.inc()
+            if random.random() >= rate:
+                return await function(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                seconds.observe(time.perf_counter() - started)
+        return async_wrapper if asyncio.iscoroutinefunction(function) else wrapper
+    return decorate
+
+
+def render_metrics():
+    # the Prometheus text exposition format
+    lines = []
+    with _lock:
+        metrics = list(_metrics.values())
+    for metric in metrics:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        for name, metric_type, help_text, value in collector():
+            lines.extend(["# HELP {}{} {}".format(PREFIX, name, help_text),
+                          "# TYPE {}{} {}".format(PREFIX, name, metric_type), "{}{} {}".format(PREFIX, name, value)])
+    return "\n".join(lines) + "\n"
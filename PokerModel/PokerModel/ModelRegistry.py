@@ -0,0 +1,108 @@
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from .Metrics import timed
+from .NumpyModel import NumpyModel
+
+# 'numpy' runs the exported weights without TensorFlow, 'keras' loads the full Keras model
+MODEL_BACKEND = os.environ.get('POKER_MODEL_BACKEND', 'numpy')
+DEFAULT_MODEL_PATH = os.environ.get('POKER_MODEL_PATH',
+                                    'static/model.h5' if MODEL_BACKEND == 'keras' else 'static/model.npz')
+# seconds between checks of the model file modification time
+RELOAD_CHECK_INTERVAL = 5.0
+
+logger = logging.getLogger(__name__)
+
+
+@timed('model_load', "Model file loads", sample_rate=1.0)
+def load_model_file(path, backend=MODEL_BACKEND):
+    if backend == 'keras':
+        # TensorFlow is only imported when the Keras backend is asked for
+        from tensorflow import keras
+
+        return keras.models.load_model(path)
+    return NumpyModel.load(path)
+
+
+def warm_up(model):
+    # one dummy inference so the graph is built before the first real request
+    dummy_input = np.zeros((1,) + tuple(model.input_shape[1:]), dtype=np.float32)
+    model(dummy_input)
+
+
+class ModelRegistry:
+    """
+    Holds a single loaded agent model per process. Every game shares the same model,
+    and a newer file on disk is swapped in without restarting the worker.
+    """
+
+    def __init__(self, model_path=DEFAULT_MODEL_PATH, backend=MODEL_BACKEND,
+                 reload_check_interval=RELOAD_CHECK_INTERVAL):
+        self.model_path = model_path
+        self.backend = backend
+        self.reload_check_interval = reload_check_interval
+        self.model = None
+        self.model_mtime = None
+        self.last_check = 0.0
+        self.load_lock = threading.Lock()
+
+    def load(self):
+        with self.load_lock:
+            return self._load()
+
+    def _load(self):
+        mtime = os.path.getmtime(self.model_path)
+        model = load_model_file(self.model_path, self.backend)
+        warm_up(model)
+        # games holding the old model keep it, new games get the new one
+        self.model = model
+        self.model_mtime = mtime
+        self.last_check = time.monotonic()
+        return model
+
+    def get_model(self):
+        if self.model is None:
+            with self.load_lock:
+                if self.model is None:
+                    self._load()
+            return self.model
+        if time.monotonic() - self.last_check > self.reload_check_interval:
+            self.reload_if_changed()
+        return self.model
+
+    def reload_if_changed(self):
+        # only one thread checks/reloads, the others keep serving the current model
+        if not self.load_lock.acquire(blocking=False):
+            return False
+        try:
+            self.last_check = time.monotonic()
+            try:
+                mtime = os.path.getmtime(self.model_path)
+            except OSError:
+                return False
+            if mtime == self.model_mtime:
+                return False
+            try:
+                self._load()
+            except Exception:
+                # a half written or broken file must not take the workers down, keep serving the old model
+                logger.exception("could not reload the model from %s, keeping the loaded one", self.model_path)
+                return False
+            return True
+        finally:
+            self.load_lock.release()
+
+
+registry = ModelRegistry()
+
+
+def get_model():
+    return registry.get_model()
+
+
+def reload_model():
+    return registry.load()
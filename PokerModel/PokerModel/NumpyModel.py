@@ -0,0 +1,82 @@
+import json
+import os
+import tempfile
+
+import numpy as np
+
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+}
+
+
+class NumpyModel:
+    """
+    Forward pass of the agent's stack of Dense layers in plain NumPy, so workers never import TensorFlow.
+    Called like the Keras model: (batch, 1, inputs) or (batch, inputs) in, (batch, actions) q-values out.
+    """
+
+    def __init__(self, layers):
+        # layers is a list of (kernel, bias, activation name)
+        self.layers = [(np.asarray(kernel, dtype=np.float32), np.asarray(bias, dtype=np.float32), activation)
+                       for kernel, bias, activation in layers]
+        self.input_shape = (None, 1, self.layers[0][0].shape[0])
+
+    def __call__(self, inputs):
+        outputs = np.asarray(inputs, dtype=np.float32).reshape(len(inputs), -1)
+        for kernel, bias, activation in self.layers:
+            outputs = ACTIVATIONS[activation](outputs @ kernel + bias)
+        return outputs
+
+    def save(self, path):
+        arrays = {}
+        for i, (kernel, bias, activation) in enumerate(self.layers):
+            arrays['kernel_{}'.format(i)] = kernel
+            arrays['bias_{}'.format(i)] = bias
+            arrays['activation_{}'.format(i)] = np.array(activation)
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        if path.endswith('.h5'):
+            return cls.from_h5(path)
+        with np.load(path) as arrays:
+            layers = []
+            while 'kernel_{}'.format(len(layers)) in arrays:
+                i = len(layers)
+                layers.append((arrays['kernel_{}'.format(i)], arrays['bias_{}'.format(i)],
+                               str(arrays['activation_{}'.format(i)])))
+        return cls(layers)
+
+    @classmethod
+    def from_h5(cls, path):
+        # reads the weights of a Keras Sequential model file with h5py, TensorFlow is not needed
+        import h5py
+
+        with h5py.File(path, 'r') as model_file:
+            config = json.loads(model_file.attrs['model_config'])
+            weights = model_file['model_weights']
+            layers = []
+            for layer in config['config']['layers']:
+                if layer['class_name'] == 'Dense':
+                    group = weights[layer['config']['name']]
+                    kernel_name, bias_name = [name.decode() if isinstance(name, bytes) else name
+                                              for name in group.attrs['weight_names']]
+                    layers.append((group[kernel_name][()], group[bias_name][()], layer['config']['activation']))
+                elif layer['class_name'] not in ('InputLayer', 'Flatten'):
+                    raise ValueError("unsupported layer {}".format(layer['class_name']))
+        return cls(layers)
+
+
+def export_model(h5_path, npz_path):
+    model = NumpyModel.from_h5(h5_path)
+    # written next to the target and renamed over it, a reloading worker never sees a half written file
+    fd, temp_path = tempfile.mkstemp(suffix='.npz', dir=os.path.dirname(os.path.abspath(npz_path)))
+    os.close(fd)
+    try:
+        model.save(temp_path)
+        os.replace(temp_path, npz_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return model
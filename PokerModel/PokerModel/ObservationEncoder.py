@@ -0,0 +1,102 @@
+import threading
+
+import numpy as np
+
+from .Cards import CARD_FEATURES, CARD_INTS
+
+# Layout of the agent input, the order get_observation always used:
+# hand (2 x 17), positions (2 x 5), community cards (5 x 17), pot, both stacks, amount to call
+CARD_WIDTH = 17
+POSITION_WIDTH = 5
+HAND_OFFSET = 0
+POSITION_OFFSET = HAND_OFFSET + 2 * CARD_WIDTH
+COMMUNITY_OFFSET = POSITION_OFFSET + 2 * POSITION_WIDTH
+POT_OFFSET = COMMUNITY_OFFSET + 5 * CARD_WIDTH
+STACKS_OFFSET = POT_OFFSET + 1
+CALL_OFFSET = STACKS_OFFSET + 2
+OBSERVATION_SIZE = CALL_OFFSET + 1
+
+# one-hot columns of a card inside its 17 wide row: the value (ace=1..king=13) and 13 + the colour, both minus one
+RANK_COLUMN_BY_ID = CARD_FEATURES[:, 0] - 1
+SUIT_COLUMN_BY_ID = 13 + CARD_FEATURES[:, 1] - 1
+CARD_COLUMNS = {card: (int(RANK_COLUMN_BY_ID[card_id]), int(SUIT_COLUMN_BY_ID[card_id]))
+                for card_id, card in enumerate(CARD_INTS)}
+
+
+class ObservationEncoder:
+    """
+    Writes the agent observation straight into a preallocated float32 buffer (or any row given as out).
+    The returned array is the buffer itself, it is overwritten by the next encode call.
+    Chips are measured in starting stacks of the env's table config, so one encoder and one batch
+    serve tables of every config.
+    """
+
+    def __init__(self):
+        self.buffer = np.zeros(OBSERVATION_SIZE, dtype=np.float32)
+
+    def encode(self, env, cur_player, other_player, out=None):
+        if out is None:
+            out = self.buffer
+        out[:] = 0
+        for offset, card in enumerate(cur_player.hand):
+            rank_column, suit_column = CARD_COLUMNS[card]
+            out[HAND_OFFSET + offset * CARD_WIDTH + rank_column] = 1
+            out[HAND_OFFSET + offset * CARD_WIDTH + suit_column] = 1
+        # both positions are marked in the first row, that is what the agent was trained on
+        out[POSITION_OFFSET + cur_player.position_id] = 1
+        out[POSITION_OFFSET + other_player.position_id] = 1
+        for offset, card in enumerate(env.community_cards):
+            rank_column, suit_column = CARD_COLUMNS[card]
+            out[COMMUNITY_OFFSET + offset * CARD_WIDTH + rank_column] = 1
+            out[COMMUNITY_OFFSET + offset * CARD_WIDTH + suit_column] = 1
+        initial_stack_size = env.config.stack_size
+        out[POT_OFFSET] = env.pot / initial_stack_size * 2
+        out[STACKS_OFFSET] = cur_player.stack_size / (initial_stack_size * 2)
+        out[STACKS_OFFSET + 1] = other_player.stack_size / (initial_stack_size * 2)
+        out[CALL_OFFSET] = (other_player.total_bet - cur_player.total_bet) / initial_stack_size
+        return out
+
+    def encode_batch(self, decisions, out=None):
+        # decisions is a sequence of (env, cur_player, other_player), one row per decision
+        if out is None:
+            out = np.empty((len(decisions), OBSERVATION_SIZE), dtype=np.float32)
+        for row, (env, cur_player, other_player) in enumerate(decisions):
+            self.encode(env, cur_player, other_player, out[row])
+        return out
+
+    def encode_tables(self, vec_env, seats, out=None):
+        # observations of every VecPokerEnv table for the given seat of each table
+        num_tables = vec_env.num_tables
+        if out is None:
+            out = np.empty((num_tables, OBSERVATION_SIZE), dtype=np.float32)
+        out[:] = 0
+        rows = vec_env.rows
+        others = 1 - seats
+        hands = vec_env.hands[rows, seats]
+        for offset in range(2):
+            out[rows, HAND_OFFSET + offset * CARD_WIDTH + RANK_COLUMN_BY_ID[hands[:, offset]]] = 1
+            out[rows, HAND_OFFSET + offset * CARD_WIDTH + SUIT_COLUMN_BY_ID[hands[:, offset]]] = 1
+        out[rows, POSITION_OFFSET + vec_env.position[rows, seats]] = 1
+        out[rows, POSITION_OFFSET + vec_env.position[rows, others]] = 1
+        board = vec_env.board
+        for offset in range(5):
+            dealt = rows[vec_env.community_count > offset]
+            out[dealt, COMMUNITY_OFFSET + offset * CARD_WIDTH + RANK_COLUMN_BY_ID[board[dealt, offset]]] = 1
+            out[dealt, COMMUNITY_OFFSET + offset * CARD_WIDTH + SUIT_COLUMN_BY_ID[board[dealt, offset]]] = 1
+        initial_stack_size = vec_env.initial_stack_size
+        out[:, POT_OFFSET] = vec_env.pot / initial_stack_size * 2
+        out[:, STACKS_OFFSET] = vec_env.stack_size[rows, seats] / (initial_stack_size * 2)
+        out[:, STACKS_OFFSET + 1] = vec_env.stack_size[rows, others] / (initial_stack_size * 2)
+        out[:, CALL_OFFSET] = (vec_env.total_bet[rows, others] - vec_env.total_bet[rows, seats]) / initial_stack_size
+        return out
+
+
+_local = threading.local()
+
+
+def get_encoder():
+    # one encoder (and buffer) per thread, so concurrent games never share a buffer
+    encoder = getattr(_local, 'encoder', None)
+    if encoder is None:
+        encoder = _local.encoder = ObservationEncoder()
+    return encoder
@@ -1,17 +1,43 @@
+import struct
+
 from .Enums import Position
+from .Cards import CARD_IDS, CARD_INTS, NO_CARD
+
+# stack, total bet, previous bet, position, flags, two hole card ids
+PLAYER_RECORD = struct.Struct('<iiiBB2B')
+SMALL_BLIND_FLAG = 1
+FOLD_FLAG = 2
+ALREADY_PLAYED_FLAG = 4
+POSITIONS = tuple(Position)
 
 
 class Player:
+    """
+    One seat of a PokerEnv. The position is kept as its Position value in position_id,
+    the engine compares those ints, position reads and writes it as a Position.
+    """
+
+    __slots__ = ('stack_size', 'hand', 'total_bet', 'previous_bet', 'position_id', 'is_small_blind', 'is_fold',
+                 'already_played')
+
     def __init__(self, stack_size, is_small_blind):
         self.stack_size = stack_size
         self.hand = []
         self.total_bet = 0
         self.previous_bet = 0
-        self.position = Position.SMALL_BLIND
+        self.position_id = Position.SMALL_BLIND.value
         self.is_small_blind = is_small_blind
         self.is_fold = False
         self.already_played = False
 
+    @property
+    def position(self):
+        return POSITIONS[self.position_id]
+
+    @position.setter
+    def position(self, position):
+        self.position_id = position.value
+
     def receive_cards(self, cards):
         self.hand = cards
 
@@ -30,3 +56,24 @@ class Player:
             self.stack_size = 0
         return amount
 
+    def to_bytes(self):
+        flags = (SMALL_BLIND_FLAG if self.is_small_blind else 0) | (FOLD_FLAG if self.is_fold else 0) | \
+                (ALREADY_PLAYED_FLAG if self.already_played else 0)
+        hand = [CARD_IDS[card] for card in self.hand] + [NO_CARD] * (2 - len(self.hand))
+        return PLAYER_RECORD.pack(self.stack_size, self.total_bet, self.previous_bet, self.position_id, flags,
+                                  hand[0], hand[1])
+
+    @classmethod
+    def from_bytes(cls, data, offset=0):
+        stack_size, total_bet, previous_bet, position, flags, first_card, second_card = \
+            PLAYER_RECORD.unpack_from(data, offset)
+        player = cls.__new__(cls)
+        player.stack_size = stack_size
+        player.hand = [CARD_INTS[card] for card in (first_card, second_card) if card != NO_CARD]
+        player.total_bet = total_bet
+        player.previous_bet = previous_bet
+        player.position_id = position
+        player.is_small_blind = bool(flags & SMALL_BLIND_FLAG)
+        player.is_fold = bool(flags & FOLD_FLAG)
+        player.already_played = bool(flags & ALREADY_PLAYED_FLAG)
+        return player
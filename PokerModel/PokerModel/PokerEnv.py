@@ -1,35 +1,141 @@
-from .Player import Player
-from treys import Deck, Evaluator, Card
+from .Player import Player, PLAYER_RECORD
+from treys import Deck, Card
 from .Enums import Position, Action
+from .HandState import HandState
+from .Cards import CARD_IDS, CARD_INTS, NUM_CARDS, NO_CARD, DeckStream, make_deck
 import numpy as np
-import math
-
-INITIAL_STACK_SIZE = 100
-SMALL_BLIND = 1
-BIG_BLIND = 2
+import struct
+
+from .TableConfig import DEFAULT_TABLE_CONFIG, TableConfig
+
+# Fixed size snapshot: version, pot, community cards, remaining deck (in treys order), both players,
+# then the table config (name cut to 32 bytes, stack size, small and big blind).
+# Version 1 snapshots end after the players.
+SNAPSHOT_VERSION = 2
+ENV_RECORD = struct.Struct('<BiB5BB{}B'.format(NUM_CARDS))
+TABLE_RECORD = struct.Struct('<32siii')
+SNAPSHOT_V1_SIZE = ENV_RECORD.size + 2 * PLAYER_RECORD.size
+SNAPSHOT_SIZE = SNAPSHOT_V1_SIZE + TABLE_RECORD.size
+
+# the amount of an action that cannot be taken, see legal_actions
+ILLEGAL = -1
+
+# Position and Action values as plain ints, the engine never touches the enums on its hot path
+SMALL_BLIND_POSITION = Position.SMALL_BLIND.value
+BIG_BLIND_POSITION = Position.BIG_BLIND.value
+CHECK = Position.CHECK.value
+CALL = Position.CALL.value
+RAISE = Position.RAISE.value
+FOLD = Action.FOLD.value
+CHECK_CALL = Action.CHECK_CALL.value
+RAISE_BIG_BLIND = Action.RAISE_BIG_BLIND.value
+ACTIONS = tuple(Action)
+
+# [player position, opponent position] -> the street is finished / the hand goes to showdown
+STAGE_READY = np.zeros((len(Position), len(Position)), dtype=bool)
+STAGE_READY[CHECK, CHECK] = STAGE_READY[RAISE, CALL] = STAGE_READY[CALL, RAISE] = True
+STAGE_READY[CHECK, CALL] = STAGE_READY[CALL, CHECK] = True
+SHOWDOWN = np.zeros((len(Position), len(Position)), dtype=bool)
+SHOWDOWN[CHECK, CHECK] = SHOWDOWN[RAISE, CALL] = SHOWDOWN[CALL, RAISE] = True
+# the same tables as nested lists, which python reads faster than numpy arrays
+STAGE_READY_LOOKUP = STAGE_READY.tolist()
+SHOWDOWN_LOOKUP = SHOWDOWN.tolist()
+
+
+def action_amounts(pot, cur_stack, cur_bet, other_stack, other_bet, can_fold, big_blind):
+    # chips put in by each action, indexed by Action values: the fold, the check or call, then the four raises
+    amount = other_bet - cur_bet
+    amounts = [0 if can_fold else ILLEGAL, amount if amount < cur_stack else cur_stack,
+               ILLEGAL, ILLEGAL, ILLEGAL, ILLEGAL]
+    # no raise without the chips to cover the call, and none into an all-in player, it would never be answered
+    if amount >= cur_stack or other_stack == 0:
+        return amounts
+    if amount == 0:
+        bets = (big_blind, (pot + 1) // 2, pot, pot * 2)
+    else:
+        bets = (amount * 2, amount + pot // 2, amount + pot, amount + pot * 2)
+    for action, bet_amount in enumerate(bets, RAISE_BIG_BLIND):
+        # the raise is cut to what the other player can still call
+        if other_stack < bet_amount:
+            bet_amount = other_stack + amount
+        if bet_amount <= cur_stack:
+            amounts[action] = bet_amount
+    return amounts
 
 
 class PokerEnv():
 
-    def __init__(self):
+    def __init__(self, rng=None, history=None, config=DEFAULT_TABLE_CONFIG):
+        # rng is an optional numpy Generator (or a DeckStream over one), when given every deck is drawn from it
+        self.decks = rng if rng is None or isinstance(rng, DeckStream) else DeckStream(rng)
+        # a TableConfig, the blinds are read when a hand is dealt
+        self.config = config
+        # when set, replaces config right before the next hand is dealt (a tournament's next blind level)
+        self.next_config = None
+        # history is an optional HandRecorder told about every hand start, action, card and hand end
+        self.history = history
         self.pot = None
         self.community_cards = None
-        self.evaluator = None
+        # ranks and draws of both seats on the current board, rebuilt every hand
+        self.hand_state = None
         self.deck = None
         # self.cards_dictionary = self.create_cards_dictionary()
         self.player = None
         self.opponent = None
         self.reset()
 
+    def to_bytes(self):
+        community_cards = [CARD_IDS[card] for card in self.community_cards]
+        community_cards += [NO_CARD] * (5 - len(community_cards))
+        deck = [CARD_IDS[card] for card in self.deck.cards]
+        deck += [NO_CARD] * (NUM_CARDS - len(deck))
+        return ENV_RECORD.pack(SNAPSHOT_VERSION, self.pot, len(self.community_cards), *community_cards,
+                               len(self.deck.cards), *deck) + self.player.to_bytes() + self.opponent.to_bytes() + \
+            TABLE_RECORD.pack(self.config.name.encode(), self.config.stack_size, self.config.small_blind,
+                              self.config.big_blind)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if len(data) not in (SNAPSHOT_SIZE, SNAPSHOT_V1_SIZE):
+            raise ValueError("snapshot must be {} bytes, got {}".format(SNAPSHOT_SIZE, len(data)))
+        record = ENV_RECORD.unpack_from(data)
+        if record[0] == SNAPSHOT_VERSION and len(data) == SNAPSHOT_SIZE:
+            name, stack_size, small_blind, big_blind = TABLE_RECORD.unpack_from(data, SNAPSHOT_V1_SIZE)
+            config = TableConfig(name.rstrip(b'\0').decode(errors='ignore'), stack_size, small_blind, big_blind)
+        elif record[0] == 1 and len(data) == SNAPSHOT_V1_SIZE:
+            # stored before snapshots held the table config, every table was a default one
+            config = DEFAULT_TABLE_CONFIG
+        else:
+            raise ValueError("unsupported snapshot version {}".format(record[0]))
+        community_count = record[2]
+        deck_count = record[8]
+        env = cls.__new__(cls)
+        env.pot = record[1]
+        env.community_cards = [CARD_INTS[card] for card in record[3:3 + community_count]]
+        env.decks = None
+        env.history = None
+        env.config = config
+        env.next_config = None
+        env.deck = make_deck([CARD_INTS[card] for card in record[9:9 + deck_count]])
+        env.player = Player.from_bytes(data, ENV_RECORD.size)
+        env.opponent = Player.from_bytes(data, ENV_RECORD.size + PLAYER_RECORD.size)
+        env.hand_state = HandState(env.player.hand, env.opponent.hand, env.community_cards)
+        return env
+
     def reset(self):
-        self.deck = Deck()
-        self.evaluator = Evaluator()
-        self.player = Player(INITIAL_STACK_SIZE, False)
-        self.opponent = Player(INITIAL_STACK_SIZE, True)
+        self.player = Player(self.config.stack_size, False)
+        self.opponent = Player(self.config.stack_size, True)
         self.reset_board()
 
+    def new_deck(self):
+        if self.decks is None:
+            return Deck()
+        return self.decks.deck()
+
     def reset_board(self):
-        self.deck = Deck()
+        if self.next_config is not None:
+            self.config, self.next_config = self.next_config, None
+        self.deck = self.new_deck()
         self.community_cards = []
         self.player.total_bet = 0
         self.opponent.total_bet = 0
@@ -40,33 +146,40 @@ class PokerEnv():
         self.pot = 0
         if self.player.is_small_blind:
             self.player.is_small_blind = False
-            self.player.position = Position.BIG_BLIND
+            self.player.position_id = BIG_BLIND_POSITION
             self.opponent.is_small_blind = True
-            self.opponent.position = Position.SMALL_BLIND
-            self.pot += self.player.place_bet(BIG_BLIND)
-            self.pot += self.opponent.place_bet(SMALL_BLIND)
+            self.opponent.position_id = SMALL_BLIND_POSITION
+            self.pot += self.player.place_bet(self.config.big_blind)
+            self.pot += self.opponent.place_bet(self.config.small_blind)
         else:
             self.player.is_small_blind = True
-            self.player.position = Position.SMALL_BLIND
+            self.player.position_id = SMALL_BLIND_POSITION
             self.opponent.is_small_blind = False
-            self.opponent.position = Position.BIG_BLIND
-            self.pot += self.player.place_bet(SMALL_BLIND)
-            self.pot += self.opponent.place_bet(BIG_BLIND)
+            self.opponent.position_id = BIG_BLIND_POSITION
+            self.pot += self.player.place_bet(self.config.small_blind)
+            self.pot += self.opponent.place_bet(self.config.big_blind)
         self.player.already_played = False
         self.opponent.already_played = False
         self.deal_hole_cards()
+        self.hand_state = HandState(self.player.hand, self.opponent.hand)
+        if self.history is not None:
+            self.history.start_hand(self)
 
     def deal_hole_cards(self):
         self.player.receive_cards(self.deck.draw(2))
         self.opponent.receive_cards(self.deck.draw(2))
 
     def deal_community_cards(self, count):
-        self.community_cards.extend(self.deck.draw(count))
+        cards = self.deck.draw(count)
+        self.community_cards.extend(cards)
+        self.hand_state.add_board_cards(cards)
+        if self.history is not None:
+            self.history.community_cards(cards)
 
     def is_game_over(self):
-        if self.player.stack_size < BIG_BLIND and not self.player.already_played:
+        if self.player.stack_size < self.config.big_blind and not self.player.already_played:
             return True
-        if self.opponent.stack_size < BIG_BLIND and not self.opponent.already_played:
+        if self.opponent.stack_size < self.config.big_blind and not self.opponent.already_played:
             return True
         return False
 
@@ -75,42 +188,24 @@ class PokerEnv():
             return True
         if self.player.is_fold:
             return False
-        player_score = self.evaluator.evaluate(self.community_cards, self.player.get_hand())
-        opponent_score = self.evaluator.evaluate(self.community_cards, self.opponent.get_hand())
+        player_score, opponent_score = self.hand_state.ranks
         if player_score <= opponent_score:
             return True
         else:  # need to deal with tie
             return False
 
     def is_stage_ready(self):
-        # check if both players execute action
-        if not self.player.already_played or not self.opponent.already_played:
-            return False
-        if self.player.total_bet != self.opponent.total_bet:
-            return False
-        # check check
-        if self.player.position == Position.CHECK and self.opponent.position == Position.CHECK:
-            return True
-        # raise call
-        if (self.player.position == Position.RAISE and self.opponent.position == Position.CALL) or \
-                (self.player.position == Position.CALL and self.opponent.position == Position.RAISE):
-            return True
-        # small call big checks
-        if (self.player.position == Position.CHECK and self.opponent.position == Position.CALL) or (
-                self.player.position == Position.CALL and self.opponent.position == Position.CHECK):
-            return True
-        return False
+        # both players acted, the bets are even and the positions close the street
+        player, opponent = self.player, self.opponent
+        return player.already_played and opponent.already_played and player.total_bet == opponent.total_bet and \
+            STAGE_READY_LOOKUP[player.position_id][opponent.position_id]
 
     def is_hand_over(self):
-        if self.player.is_fold or self.opponent.is_fold:
+        player, opponent = self.player, self.opponent
+        if player.is_fold or opponent.is_fold:
             return True
-        if len(self.community_cards) == 5 and self.player.already_played and self.opponent.already_played:
-            if (self.player.position == Position.CHECK and self.opponent.position == Position.CHECK) or \
-                    (
-                            self.player.position == Position.CALL and self.opponent.position == Position.RAISE) or \
-                    (self.player.position == Position.RAISE and self.opponent.position == Position.CALL):
-                return True
-        return False
+        return len(self.community_cards) == 5 and player.already_played and opponent.already_played and \
+            SHOWDOWN_LOOKUP[player.position_id][opponent.position_id]
 
     def update_board(self):
         cards_on_board = len(self.community_cards)
@@ -133,21 +228,36 @@ class PokerEnv():
         if self.is_stage_ready():
             self.update_board()
 
+    def action_amounts(self, cur_player, other_player):
+        # legal_actions as a list, for the env's own use
+        other_position = other_player.position_id
+        can_fold = other_player.already_played and other_position != CHECK and other_position != CALL
+        return action_amounts(self.pot, cur_player.stack_size, cur_player.total_bet, other_player.stack_size,
+                              other_player.total_bet, can_fold, self.config.big_blind)
+
+    def legal_actions(self, cur_player, other_player):
+        """
+        The chips every action of cur_player would put in the pot, ILLEGAL for the actions it cannot take,
+        as an array indexed by Action values.
+        A raise that cannot be made is ILLEGAL, executing it anyway plays a call.
+        """
+        return np.array(self.action_amounts(cur_player, other_player), dtype=np.int32)
+
+    def get_player_valid_actions(self, other_player, cur_player=None):
+        # the Action values cur_player (by default the seat facing other_player) can take, see legal_actions
+        if cur_player is None:
+            cur_player = self.opponent if other_player is self.player else self.player
+        return np.flatnonzero(self.legal_actions(cur_player, other_player) != ILLEGAL).tolist()
+
     def perform_player_action(self, cur_player, other_player, action):
-        final_action = None
-        if action == Action.FOLD.value:
-            final_action = self.perform_fold(cur_player)
-        if action == Action.CHECK_CALL.value:
-            final_action = self.perform_call(cur_player, other_player)
-        if action == Action.RAISE_BIG_BLIND.value:
-            final_action = self.perform_raise_big_blind(cur_player, other_player)
-        if action == Action.RAISE_HALF_POT.value:
-            final_action = self.perform_raise_half_pot(cur_player, other_player)
-        if action == Action.RAISE_POT.value:
-            final_action = self.perform_raise_pot(cur_player, other_player)
-        if action == Action.RAISE_TWO_POT.value:
-            final_action = self.perform_raise_two_pot(cur_player, other_player)
-        return final_action
+        if action == FOLD:
+            return self.perform_fold(cur_player)
+        bet_amount = self.action_amounts(cur_player, other_player)[action]
+        if action == CHECK_CALL or bet_amount == ILLEGAL:
+            return self.perform_call(cur_player, other_player)
+        self.pot += cur_player.place_bet(bet_amount)
+        cur_player.position_id = RAISE
+        return ACTIONS[action]
 
     def perform_fold(self, cur_player):
         cur_player.is_fold = True
@@ -156,7 +266,7 @@ class PokerEnv():
     def perform_check(self, cur_player, other_player):
         if cur_player.total_bet != other_player.total_bet:
             return self.perform_call(cur_player, other_player)
-        cur_player.position = Position.CHECK
+        cur_player.position_id = CHECK
         return Action.CHECK_CALL
 
     def perform_call(self, cur_player, other_player):
@@ -164,7 +274,7 @@ class PokerEnv():
         if amount == 0:
             return self.perform_check(cur_player, other_player)
         self.pot += cur_player.place_bet(int(amount))
-        cur_player.position = Position.CALL
+        cur_player.position_id = CALL
         if cur_player.total_bet != other_player.total_bet:
             pot_change = other_player.total_bet - cur_player.total_bet
             self.pot -= pot_change
@@ -172,85 +282,24 @@ class PokerEnv():
             other_player.total_bet -= pot_change
         return Action.CHECK_CALL
 
-    def perform_raise_big_blind(self, cur_player, other_player):
-        amount = other_player.total_bet - cur_player.total_bet
-        if amount >= cur_player.stack_size:
-            return self.perform_call(cur_player, other_player)
-        if amount == 0:
-            bet_amount = BIG_BLIND
-        else:
-            bet_amount = amount * 2
-        if other_player.stack_size < bet_amount:
-            bet_amount = other_player.stack_size + amount
-        if cur_player.stack_size < bet_amount:
-            return self.perform_call(cur_player, other_player)
-        else:
-            self.pot += cur_player.place_bet(int(bet_amount))
-            cur_player.position = Position.RAISE
-            return Action.RAISE_BIG_BLIND
-
-    def perform_raise_half_pot(self, cur_player, other_player):
-        amount = other_player.total_bet - cur_player.total_bet
-        if amount >= cur_player.stack_size:
-            return self.perform_call(cur_player, other_player)
-        if amount == 0:
-            bet_amount = math.ceil(self.pot / 2.0)
-        else:
-            bet_amount = amount + self.pot // 2
-        if other_player.stack_size < bet_amount:
-            bet_amount = other_player.stack_size + amount
-        if cur_player.stack_size < bet_amount:
-            return self.perform_call(cur_player, other_player)
-        else:
-            self.pot += cur_player.place_bet(int(bet_amount))
-            cur_player.position = Position.RAISE
-            return Action.RAISE_HALF_POT
-
-    def perform_raise_pot(self, cur_player, other_player):
-        amount = other_player.total_bet - cur_player.total_bet
-        if amount >= cur_player.stack_size:
-            return self.perform_call(cur_player, other_player)
-        if amount == 0:
-            bet_amount = self.pot
-        else:
-            bet_amount = amount + self.pot
-        if other_player.stack_size < bet_amount:
-            bet_amount = other_player.stack_size + amount
-        if cur_player.stack_size < bet_amount:
-            return self.perform_call(cur_player, other_player)
-        else:
-            self.pot += cur_player.place_bet(int(bet_amount))
-            cur_player.position = Position.RAISE
-            return Action.RAISE_POT
-
-    def perform_raise_two_pot(self, cur_player, other_player):
-        amount = other_player.total_bet - cur_player.total_bet
-        if amount >= cur_player.stack_size:
-            return self.perform_call(cur_player, other_player)
-        if amount == 0:
-            bet_amount = self.pot * 2
-        else:
-            bet_amount = amount + self.pot * 2
-        if other_player.stack_size < bet_amount:
-            bet_amount = other_player.stack_size + amount
-        if cur_player.stack_size < bet_amount:
-            return self.perform_call(cur_player, other_player)
-        else:
-            self.pot += cur_player.place_bet(int(bet_amount))
-            cur_player.position = Position.RAISE
-            return Action.RAISE_TWO_POT
-
     def execute_player_action(self, cur_player, other_player, action):
         final_action = ""
         wining_env = ""
         if self.check_if_playable(cur_player, other_player):
-                final_action = self.perform_player_action(cur_player, other_player, action).name
+                performed = self.perform_player_action(cur_player, other_player, action)
+                final_action = performed.name
                 cur_player.already_played = True
+                if self.history is not None:
+                    self.history.action(0 if cur_player is self.player else 1, performed.value, self.pot)
         if cur_player.stack_size == 0:
-            if cur_player.position == Position.CALL:
+            if cur_player.position_id == CALL:
                 self.update_all_in_stage()
         if self.is_hand_over():
-            if self.is_first_player_won():
+            player_won = self.is_first_player_won()
+            if self.history is not None:
+                showdown = not (self.player.is_fold or self.opponent.is_fold)
+                self.history.end_hand(0 if player_won else 1, showdown, self.pot)
+            if player_won:
                 self.player.stack_size += self.pot
                 wining_env = self.full_print() + "\nplayer won"
             else:
@@ -284,16 +333,6 @@ class PokerEnv():
         else:
             return True
 
-    def get_player_valid_actions(self, other_player):
-        if other_player.already_played:
-            if other_player.position == Position.CHECK or other_player.position == Position.CALL:
-                valid_actions = [1, 2, 3, 4, 5]
-            else:
-                valid_actions = [0, 1, 2, 3, 4, 5]
-        else:
-            valid_actions = [1, 2, 3, 4, 5]
-        return valid_actions
-
     def full_print(self):
         s = \
             "community cards:" + self.cards_print(self.community_cards) + "\n" + \
@@ -0,0 +1,70 @@
+import hashlib
+import json
+from collections import namedtuple
+
+import numpy as np
+
+from .PokerEnv import PokerEnv
+
+# a game is its seed and every action executed in it (both seats), digest is the sha1 of the final snapshot
+GameRecord = namedtuple('GameRecord', ['seed', 'actions', 'digest'])
+
+
+def create_rngs(seed=None):
+    # separate deck and agent streams, so a replay deals the same cards without sampling the agent again
+    return tuple(np.random.default_rng(seed_sequence) for seed_sequence in np.random.SeedSequence(seed).spawn(2))
+
+
+def replay(seed, actions, history=None):
+    """
+    Plays actions on a fresh PokerEnv dealt from seed, each one by the seat Game.step would move.
+    Stops when the game is over and returns the env with the (seat, action taken, done) of every step.
+    """
+    deck_rng, _ = create_rngs(seed)
+    env = PokerEnv(rng=deck_rng, history=history)
+    steps = []
+    for action in actions:
+        if env.check_if_playable(env.player, env.opponent):
+            seat = 0
+            done, action_taken, _ = env.execute_player_action(env.player, env.opponent, action)
+        else:
+            seat = 1
+            done, action_taken, _ = env.execute_player_action(env.opponent, env.player, action)
+        steps.append((seat, action_taken, done))
+        if done:
+            break
+    return env, steps
+
+
+def digest(env):
+    return hashlib.sha1(env.to_bytes()).hexdigest()
+
+
+def record_game(seed, model, max_actions=1000):
+    # plays a whole game, the player seat takes uniform random actions, both seats draw from the seed
+    from .Game import Game
+
+    game = Game()
+    game.reset(seed)
+    game.agent_model = model
+    player_rng = np.random.default_rng([seed, 0])
+    while not game.done and len(game.actions) < max_actions:
+        game.step(int(player_rng.integers(6)))
+    return GameRecord(seed, list(game.actions), digest(game.env))
+
+
+def verify(record):
+    env, _ = replay(record.seed, record.actions)
+    return digest(env) == record.digest
+
+
+def save_records(path, records):
+    with open(path, 'w') as corpus:
+        for record in records:
+            corpus.write(json.dumps(record._asdict()) + "\n")
+
+
+def load_records(path):
+    with open(path) as corpus:
+        for line in corpus:
+            yield GameRecord(**json.loads(line))
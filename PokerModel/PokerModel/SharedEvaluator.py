@@ -0,0 +1,81 @@
+import os
+import threading
+
+import numpy as np
+from treys import Evaluator
+from treys.lookup import LookupTable
+
+# when this file exists the lookup tables are memory-mapped from it, shared by every process on the machine
+EVALUATOR_TABLE_PATH = os.environ.get('POKER_EVALUATOR_TABLE', 'static/evaluator_table.npy')
+
+
+class MappedLookup:
+    # read-only prime product -> rank mapping over two sorted arrays
+    def __init__(self, keys, ranks):
+        self.keys = keys
+        self.ranks = ranks
+
+    def __getitem__(self, prime):
+        index = np.searchsorted(self.keys, prime)
+        if index == len(self.keys) or self.keys[index] != prime:
+            raise KeyError(prime)
+        return int(self.ranks[index])
+
+    def __len__(self):
+        return len(self.keys)
+
+
+def lookup_to_arrays(lookup):
+    keys = np.array(sorted(lookup), dtype=np.int64)
+    ranks = np.array([lookup[key] for key in keys], dtype=np.int64)
+    return keys, ranks
+
+
+def save_lookup_table(path, table=None):
+    # layout: [flush count, unsuited count, flush keys, flush ranks, unsuited keys, unsuited ranks]
+    table = table or LookupTable()
+    flush_keys, flush_ranks = lookup_to_arrays(table.flush_lookup)
+    unsuited_keys, unsuited_ranks = lookup_to_arrays(table.unsuited_lookup)
+    data = np.concatenate([[len(flush_keys), len(unsuited_keys)], flush_keys, flush_ranks,
+                           unsuited_keys, unsuited_ranks]).astype(np.int64)
+    np.save(path, data)
+
+
+class MappedLookupTable:
+    def __init__(self, path):
+        data = np.load(path, mmap_mode='r')
+        flush_count, unsuited_count = int(data[0]), int(data[1])
+        flush_end = 2 + 2 * flush_count
+        self.flush_lookup = MappedLookup(data[2:2 + flush_count], data[2 + flush_count:flush_end])
+        self.unsuited_lookup = MappedLookup(data[flush_end:flush_end + unsuited_count],
+                                            data[flush_end + unsuited_count:flush_end + 2 * unsuited_count])
+
+
+class MappedEvaluator(Evaluator):
+    def __init__(self, path):
+        self.table = MappedLookupTable(path)
+        self.hand_size_map = {
+            5: self._five,
+            6: self._six,
+            7: self._seven
+        }
+
+
+_evaluator = None
+_lock = threading.Lock()
+
+
+def create_evaluator(path=EVALUATOR_TABLE_PATH):
+    if path and os.path.exists(path):
+        return MappedEvaluator(path)
+    return Evaluator()
+
+
+def get_evaluator():
+    # one read-only evaluator per process, built on first use
+    global _evaluator
+    if _evaluator is None:
+        with _lock:
+            if _evaluator is None:
+                _evaluator = create_evaluator()
+    return _evaluator
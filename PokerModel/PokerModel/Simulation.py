@@ -0,0 +1,159 @@
+import glob
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .Enums import Action
+from .Equity import Z_95
+from .NumpyModel import NumpyModel
+from .ObservationEncoder import OBSERVATION_SIZE, ObservationEncoder
+from .TableConfig import DEFAULT_TABLE_CONFIG
+from .VecPokerEnv import PLAYER, VecPokerEnv
+
+NUM_TABLES = 256
+# finished hands buffered by a worker before they are appended to its results file
+FLUSH_HANDS = 65536
+
+# one record per finished hand, from the point of view of the player policy
+HAND_RESULT = np.dtype([('chips', '<i4'), ('showdown', '?'), ('won', '?')])
+
+SimulationResult = namedtuple('SimulationResult', ['hands', 'bb_per_100', 'error', 'showdowns', 'seconds',
+                                                   'hands_per_second'])
+
+
+class AgentPolicy:
+    # samples from the softmax of the q-values over the valid actions, like get_other_player_action
+
+    def __init__(self, model):
+        self.model = model
+
+    def __call__(self, observations, valid_actions, rng):
+        q_values = np.asarray(self.model(observations[:, np.newaxis, :]), dtype=np.float64)
+        q_values = np.where(valid_actions, q_values, -np.inf)
+        e_x = np.exp(q_values - q_values.max(axis=1, keepdims=True))
+        cumulative = np.cumsum(e_x, axis=1)
+        draws = rng.random(len(observations)) * cumulative[:, -1]
+        return (cumulative <= draws[:, np.newaxis]).sum(axis=1)
+
+
+def random_policy(observations, valid_actions, rng):
+    cumulative = np.cumsum(valid_actions, axis=1)
+    draws = rng.integers(0, cumulative[:, -1])
+    return (cumulative <= draws[:, np.newaxis]).sum(axis=1)
+
+
+def call_policy(observations, valid_actions, rng):
+    return np.full(len(observations), Action.CHECK_CALL.value)
+
+
+BASELINES = {
+    'random': random_policy,
+    'call': call_policy,
+}
+
+
+def create_policy(spec):
+    # a baseline name or the path of a model file (.npz or Keras .h5, read without TensorFlow)
+    if spec in BASELINES:
+        return BASELINES[spec]
+    return AgentPolicy(NumpyModel.load(spec))
+
+
+def results_path(output, worker):
+    return os.path.join(output, 'hands_{}.bin'.format(worker))
+
+
+def simulate_worker(player, opponent, num_hands, num_tables, seed, output, worker, table=DEFAULT_TABLE_CONFIG):
+    """
+    Plays num_hands hands on num_tables tables stepped together. The player policy sits in seat 0 of even
+    tables and seat 1 of odd ones, so the edge of a seat (seat 0 wins ties) cancels out.
+    Appends every finished hand to the worker's results file and returns its hand, chips, chips squared
+    and showdown totals.
+    """
+    player_policy, opponent_policy = create_policy(player), create_policy(opponent)
+    env = VecPokerEnv(num_tables, seed=seed, configs=table)
+    player_seat = env.rows % 2
+    encoder = ObservationEncoder()
+    rng = np.random.default_rng([seed, worker])
+    observations = np.empty((num_tables, OBSERVATION_SIZE), dtype=np.float32)
+    actions = np.empty(num_tables, dtype=np.int64)
+    buffer = np.empty(FLUSH_HANDS + num_tables, dtype=HAND_RESULT)
+    buffered = hands = 0
+    chips_sum = chips_squared_sum = showdowns = 0
+    with open(results_path(output, worker), 'wb') as results:
+        while hands < num_hands:
+            seats = env.current_player()
+            encoder.encode_tables(env, seats, observations)
+            valid_actions = env.valid_actions_mask()
+            for turn, policy in ((seats == player_seat, player_policy), (seats != player_seat, opponent_policy)):
+                rows = np.flatnonzero(turn)
+                if len(rows):
+                    actions[rows] = policy(observations[rows], valid_actions[rows], rng)
+            _, final_actions, hand_over, player_won = env.step(actions)
+
+            over_rows = np.flatnonzero(hand_over)
+            if len(over_rows) > num_hands - hands:
+                # the last step finished more hands than needed, keep a random subset so no table index
+                # (and no seat, they alternate by table) is favoured
+                over_rows = np.sort(rng.choice(over_rows, num_hands - hands, replace=False))
+            if len(over_rows):
+                records = buffer[buffered:buffered + len(over_rows)]
+                # hand_result and player_won are seat 0's, the game is zero sum
+                chips = np.where(player_seat[over_rows] == PLAYER, env.hand_result[over_rows],
+                                 -env.hand_result[over_rows])
+                records['chips'] = chips
+                records['showdown'] = final_actions[over_rows] != Action.FOLD.value
+                records['won'] = player_won[over_rows] == (player_seat[over_rows] == PLAYER)
+                chips_sum += int(chips.sum())
+                chips_squared_sum += int((chips * chips).sum())
+                showdowns += int(records['showdown'].sum())
+                buffered += len(over_rows)
+                hands += len(over_rows)
+            if buffered >= FLUSH_HANDS or (buffered and hands >= num_hands):
+                buffer[:buffered].tofile(results)
+                buffered = 0
+    return hands, chips_sum, chips_squared_sum, showdowns
+
+
+def read_results(output):
+    # every hand written by every worker, worker by worker
+    worker = 0
+    while os.path.exists(results_path(output, worker)):
+        yield np.fromfile(results_path(output, worker), dtype=HAND_RESULT)
+        worker += 1
+
+
+def summarize(hands, chips_sum, chips_squared_sum, showdowns, seconds, big_blind=DEFAULT_TABLE_CONFIG.big_blind):
+    mean = chips_sum / hands
+    variance = max(chips_squared_sum / hands - mean ** 2, 0.0)
+    bb_per_100 = mean / big_blind * 100
+    error = Z_95 * np.sqrt(variance / hands) / big_blind * 100
+    return SimulationResult(hands, bb_per_100, float(error), showdowns, seconds, hands / seconds)
+
+
+def run_simulation(player, opponent, num_hands, output, workers=1, num_tables=NUM_TABLES, seed=0,
+                   table=DEFAULT_TABLE_CONFIG):
+    """
+    Splits num_hands between workers processes, each with its own tables and seed, and reports the player's
+    bb/100 with its 95% confidence interval. Every table plays with the stacks and blinds of the table config.
+    Per hand results are left in output, see read_results.
+    """
+    os.makedirs(output, exist_ok=True)
+    # results of an earlier run with more workers would be read back as this run's
+    for path in glob.glob(results_path(output, '*')):
+        os.remove(path)
+    worker_seeds = [int(worker_seed) for worker_seed in np.random.SeedSequence(seed).generate_state(workers)]
+    worker_hands = [num_hands // workers + (worker < num_hands % workers) for worker in range(workers)]
+    jobs = (simulate_worker, [player] * workers, [opponent] * workers, worker_hands, [num_tables] * workers,
+            worker_seeds, [output] * workers, range(workers), [table] * workers)
+    started = time.perf_counter()
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            totals = list(pool.map(*jobs))
+    else:
+        totals = list(map(*jobs))
+    seconds = time.perf_counter() - started
+    return summarize(*[sum(column) for column in zip(*totals)], seconds, table.big_blind)
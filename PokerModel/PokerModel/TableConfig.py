@@ -0,0 +1,43 @@
+import threading
+from collections import namedtuple
+
+# the stacks and blinds of the default table
+INITIAL_STACK_SIZE = 100
+SMALL_BLIND = 1
+BIG_BLIND = 2
+
+# Stacks and blinds of a table. PokerEnv deals and bets with them, the observation encoder
+# measures chips in starting stacks, so tables of different configs can share one batch of the agent.
+TableConfig = namedtuple('TableConfig', ['name', 'stack_size', 'small_blind', 'big_blind'])
+
+DEFAULT_TABLE_CONFIG = TableConfig('default', INITIAL_STACK_SIZE, SMALL_BLIND, BIG_BLIND)
+
+_configs = {}
+_lock = threading.Lock()
+
+
+def register_table_config(config):
+    # a name always means the same table, registering it again with other values is an error
+    with _lock:
+        registered = _configs.setdefault(config.name, config)
+    if registered != config:
+        raise ValueError("table config {!r} is already registered as {}".format(config.name, registered))
+    return config
+
+
+def get_table_config(name=None):
+    if name is None:
+        return DEFAULT_TABLE_CONFIG
+    try:
+        return _configs[name]
+    except KeyError:
+        raise ValueError("unknown table config {!r}, registered: {}".format(name, ", ".join(_configs))) from None
+
+
+def table_configs():
+    return list(_configs.values())
+
+
+register_table_config(DEFAULT_TABLE_CONFIG)
+register_table_config(TableConfig('deep', 4 * INITIAL_STACK_SIZE, SMALL_BLIND, BIG_BLIND))
+register_table_config(TableConfig('short', INITIAL_STACK_SIZE // 4, SMALL_BLIND, BIG_BLIND))
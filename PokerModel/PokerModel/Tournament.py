@@ -0,0 +1,145 @@
+import functools
+import time
+from collections import defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .Enums import Action
+from .ObservationEncoder import OBSERVATION_SIZE, ObservationEncoder
+from .PokerEnv import ILLEGAL, PokerEnv
+from .Simulation import create_policy
+from .TableConfig import DEFAULT_TABLE_CONFIG
+
+# (small blind, big blind) of every level, a match moves up one level every HANDS_PER_LEVEL hands
+BLIND_LEVELS = ((1, 2), (2, 4), (3, 6), (5, 10), (10, 20), (15, 30), (25, 50), (50, 100), (100, 200))
+HANDS_PER_LEVEL = 10
+# a match still running after this many hands goes to the bigger stack
+MAX_HANDS = 1000
+
+# table is the TableConfig the levels start from, every level keeps its stacks and plays the level's blinds
+TournamentConfig = namedtuple('TournamentConfig', ['table', 'blind_levels', 'hands_per_level', 'max_hands'])
+DEFAULT_CONFIG = TournamentConfig(DEFAULT_TABLE_CONFIG, BLIND_LEVELS, HANDS_PER_LEVEL, MAX_HANDS)
+
+RoundResult = namedtuple('RoundResult', ['winners', 'hands', 'decisions'])
+TournamentResult = namedtuple('TournamentResult', ['champion', 'rounds', 'matches', 'hands', 'decisions', 'seconds',
+                                                   'tables_per_second', 'hands_per_second'])
+
+
+class Match:
+    """
+    One heads-up table of the bracket, the first entrant sits in the player seat.
+    The table finishes when a stack can no longer post the big blind, or after max_hands to the bigger stack.
+    """
+
+    def __init__(self, first, second, seed, config):
+        self.entrants = (first, second)
+        self.config = config
+        self.levels = level_configs(config)
+        self.env = PokerEnv(rng=np.random.default_rng(seed), config=self.levels[0])
+        self.hands = 0
+        self.env.next_config = self.level_config(1)
+        self.winner = None
+
+    def level_config(self, hands):
+        # the table config of the hand dealt after hands finished hands
+        return self.levels[min(hands // self.config.hands_per_level, len(self.levels) - 1)]
+
+    def seat_to_act(self):
+        env = self.env
+        if env.check_if_playable(env.player, env.opponent):
+            return 0, env.player, env.opponent
+        return 1, env.opponent, env.player
+
+    def play(self, cur_player, other_player, action):
+        done, _, winner = self.env.execute_player_action(cur_player, other_player, action)
+        if winner:
+            self.hands += 1
+            # the hand just dealt already plays its level, queue the level of the one after it
+            self.env.next_config = self.level_config(self.hands + 1)
+        if done or self.hands >= self.config.max_hands:
+            player, opponent = self.env.player, self.env.opponent
+            self.winner = self.entrants[0] if player.stack_size >= opponent.stack_size else self.entrants[1]
+
+
+def level_configs(config):
+    # the table config of every blind level, same stacks
+    return [config.table._replace(name='{} level {}'.format(config.table.name, level), small_blind=small_blind,
+                                  big_blind=big_blind)
+            for level, (small_blind, big_blind) in enumerate(config.blind_levels, 1)]
+
+
+@functools.lru_cache(maxsize=None)
+def worker_policy(spec):
+    # every policy is loaded once per process and kept for the next rounds
+    return create_policy(spec)
+
+
+def play_round(specs, pairings, seed, config=DEFAULT_CONFIG):
+    """
+    Plays the matches of pairings (entrant index pairs) to the end, all tables stepped together.
+    Each step encodes every table waiting on a decision and asks each policy once for all of its tables.
+    seed is a list of ints, table i deals from seed + [i].
+    Returns the winner of every pairing in order, with the hands played and decisions made.
+    """
+    matches = [Match(first, second, seed + [table], config) for table, (first, second) in enumerate(pairings)]
+    encoder = ObservationEncoder()
+    rng = np.random.default_rng(seed)
+    observations = np.empty((len(matches), OBSERVATION_SIZE), dtype=np.float32)
+    valid_actions = np.empty((len(matches), len(Action)), dtype=bool)
+    active = list(matches)
+    decisions = 0
+    while active:
+        turns = []
+        rows_by_spec = defaultdict(list)
+        for row, match in enumerate(active):
+            seat, cur_player, other_player = match.seat_to_act()
+            encoder.encode(match.env, cur_player, other_player, observations[row])
+            valid_actions[row] = match.env.legal_actions(cur_player, other_player) != ILLEGAL
+            rows_by_spec[specs[match.entrants[seat]]].append(row)
+            turns.append((cur_player, other_player))
+        actions = np.empty(len(active), dtype=np.int64)
+        for spec, rows in rows_by_spec.items():
+            actions[rows] = worker_policy(spec)(observations[rows], valid_actions[rows], rng)
+        decisions += len(active)
+        for match, (cur_player, other_player), action in zip(active, turns, actions.tolist()):
+            match.play(cur_player, other_player, action)
+        active = [match for match in active if match.winner is None]
+    return RoundResult([match.winner for match in matches], sum(match.hands for match in matches), decisions)
+
+
+def run_tournament(specs, workers=1, seed=0, config=DEFAULT_CONFIG):
+    """
+    Single elimination bracket between the entrants, each one a policy spec (see Simulation.create_policy).
+    Entrants are seeded in a random order, an odd one out gets a bye. Every round's matches are split
+    between the worker processes, the bracket waits for the whole round before pairing the winners.
+    Returns the champion's entrant index and the throughput in tables (matches) per second.
+    """
+    rng = np.random.default_rng(seed)
+    alive = rng.permutation(len(specs)).tolist()
+    rounds = matches = hands = decisions = 0
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    started = time.perf_counter()
+    try:
+        while len(alive) > 1:
+            pairings = list(zip(alive[0::2], alive[1::2]))
+            bye = alive[-1:] if len(alive) % 2 else []
+            shares = [pairings[worker::workers] for worker in range(workers)]
+            jobs = (play_round, [specs] * workers, shares,
+                    [[seed, rounds, worker] for worker in range(workers)], [config] * workers)
+            results = list(pool.map(*jobs) if pool else map(*jobs))
+            # put the winners back in bracket order
+            winners = [None] * len(pairings)
+            for worker, result in enumerate(results):
+                winners[worker::workers] = result.winners
+                hands += result.hands
+                decisions += result.decisions
+            alive = winners + bye
+            rounds += 1
+            matches += len(pairings)
+    finally:
+        if pool:
+            pool.shutdown()
+    seconds = time.perf_counter() - started
+    return TournamentResult(alive[0], rounds, matches, hands, decisions, seconds, matches / seconds,
+                            hands / seconds)
@@ -0,0 +1,247 @@
+import numpy as np
+
+from .BatchEvaluator import get_batch_evaluator
+from .Cards import DECK_BATCH, NUM_CARDS
+from .Enums import Action
+from .PokerEnv import ILLEGAL, SMALL_BLIND_POSITION, BIG_BLIND_POSITION, \
+    CHECK, CALL, RAISE, STAGE_READY, SHOWDOWN
+from .TableConfig import DEFAULT_TABLE_CONFIG, TableConfig
+
+PLAYER = 0
+OPPONENT = 1
+NO_ACTION = -1
+
+# hole cards come off the deck first (player then opponent), the board is dealt from the next five cards
+HOLE_CARDS = 4
+
+# community cards on the board after the next street is dealt
+NEXT_STREET = np.array([3, 1, 2, 4, 5, 5])
+
+
+def table_rngs(seed, num_tables):
+    # one generator per table, PokerEnv(rng=table_rngs(seed, n)[i]) deals the same cards as table i
+    return [np.random.default_rng(seed_sequence) for seed_sequence in np.random.SeedSequence(seed).spawn(num_tables)]
+
+
+class VecPokerEnv:
+    """
+    N heads-up tables stepped together, the rules are the ones of PokerEnv expressed as masked array operations.
+    Seat 0 is PokerEnv.player and seat 1 is PokerEnv.opponent, cards are compact ids (see Cards.py).
+    Finished hands start the next hand and finished games start a new game automatically.
+    configs is one TableConfig for every table or a sequence of one per table.
+    """
+
+    def __init__(self, num_tables, seed=None, configs=DEFAULT_TABLE_CONFIG):
+        self.num_tables = num_tables
+        self.rows = np.arange(num_tables)
+        if isinstance(configs, TableConfig):
+            configs = [configs] * num_tables
+        self.configs = list(configs)
+        if len(self.configs) != num_tables:
+            raise ValueError("{} table configs for {} tables".format(len(self.configs), num_tables))
+        # the stacks and blinds of every table
+        self.initial_stack_size = np.array([config.stack_size for config in self.configs], dtype=np.int64)
+        self.small_blind = np.array([config.small_blind for config in self.configs], dtype=np.int64)
+        self.big_blind = np.array([config.big_blind for config in self.configs], dtype=np.int64)
+        self.rngs = table_rngs(seed, num_tables)
+        self.evaluator = get_batch_evaluator()
+        self.stack_size = np.zeros((num_tables, 2), dtype=np.int64)
+        self.total_bet = np.zeros((num_tables, 2), dtype=np.int64)
+        self.previous_bet = np.zeros((num_tables, 2), dtype=np.int64)
+        self.position = np.zeros((num_tables, 2), dtype=np.int64)
+        self.is_small_blind = np.zeros((num_tables, 2), dtype=bool)
+        self.is_fold = np.zeros((num_tables, 2), dtype=bool)
+        self.already_played = np.zeros((num_tables, 2), dtype=bool)
+        self.pot = np.zeros(num_tables, dtype=np.int64)
+        self.deck = np.zeros((num_tables, NUM_CARDS), dtype=np.int64)
+        # the next DECK_BATCH decks of every table, drawn like Cards.DeckStream draws them
+        self.deck_orders = np.zeros((num_tables, DECK_BATCH, NUM_CARDS), dtype=np.uint8)
+        self.next_order = np.full(num_tables, DECK_BATCH, dtype=np.int64)
+        self.community_count = np.zeros(num_tables, dtype=np.int64)
+        # the player's stack before the blinds of the current hand, and the chips it won in its last finished hand
+        self.hand_start_stack = np.zeros(num_tables, dtype=np.int64)
+        self.hand_result = np.zeros(num_tables, dtype=np.int64)
+        self.reset()
+
+    @property
+    def hands(self):
+        # (tables, seat, card)
+        return self.deck[:, :HOLE_CARDS].reshape(-1, 2, 2)
+
+    @property
+    def board(self):
+        # all five board cards, only the first community_count of them are dealt
+        return self.deck[:, HOLE_CARDS:HOLE_CARDS + 5]
+
+    def reset(self, mask=None):
+        rows = self.rows if mask is None else np.flatnonzero(mask)
+        self.stack_size[rows] = self.initial_stack_size[rows, np.newaxis]
+        self.position[rows] = SMALL_BLIND_POSITION
+        self.is_small_blind[rows] = (False, True)
+        self.reset_board(rows)
+
+    def reset_board(self, rows):
+        self.deal_decks(rows)
+        self.community_count[rows] = 0
+        self.total_bet[rows] = 0
+        self.previous_bet[rows] = 0
+        self.is_fold[rows] = False
+        self.pot[rows] = 0
+        self.hand_start_stack[rows] = self.stack_size[rows, PLAYER]
+        # the blinds move every hand
+        player_small_blind = ~self.is_small_blind[rows, PLAYER]
+        self.is_small_blind[rows, PLAYER] = player_small_blind
+        self.is_small_blind[rows, OPPONENT] = ~player_small_blind
+        self.position[rows, PLAYER] = np.where(player_small_blind, SMALL_BLIND_POSITION, BIG_BLIND_POSITION)
+        self.position[rows, OPPONENT] = np.where(player_small_blind, BIG_BLIND_POSITION, SMALL_BLIND_POSITION)
+        small_blind, big_blind = self.small_blind[rows], self.big_blind[rows]
+        self.pot[rows] += self.place_bet(rows, PLAYER, np.where(player_small_blind, small_blind, big_blind))
+        self.pot[rows] += self.place_bet(rows, OPPONENT, np.where(player_small_blind, big_blind, small_blind))
+        self.already_played[rows] = False
+
+    def deal_decks(self, rows):
+        empty = rows[self.next_order[rows] == DECK_BATCH]
+        if len(empty):
+            # one argsort for the tables that dealt their whole batch
+            keys = np.stack([self.rngs[row].random((DECK_BATCH, NUM_CARDS)) for row in empty])
+            self.deck_orders[empty] = np.argsort(keys, axis=2)
+            self.next_order[empty] = 0
+        self.deck[rows] = self.deck_orders[rows, self.next_order[rows]]
+        self.next_order[rows] += 1
+
+    def place_bet(self, rows, seats, amount):
+        stack_size = self.stack_size[rows, seats]
+        placed = np.where(amount < stack_size, amount, stack_size)
+        self.previous_bet[rows, seats] = self.total_bet[rows, seats]
+        self.total_bet[rows, seats] += placed
+        self.stack_size[rows, seats] -= placed
+        return placed
+
+    def is_playable(self, seat):
+        played = self.already_played[:, seat]
+        other_played = self.already_played[:, 1 - seat]
+        return (~played & ~other_played & self.is_small_blind[:, seat]) | (~played & other_played) | \
+            (played & other_played & (self.total_bet[:, seat] < self.total_bet[:, 1 - seat]))
+
+    def current_player(self):
+        # the seat Game.step would move: the player when playable, otherwise the opponent
+        return np.where(self.is_playable(PLAYER), PLAYER, OPPONENT)
+
+    def legal_actions(self):
+        # PokerEnv.legal_actions of the seat to act of every table, (tables, actions)
+        cur = self.current_player()
+        return self.action_amounts(self.rows, cur, 1 - cur)
+
+    def valid_actions_mask(self):
+        return self.legal_actions() != ILLEGAL
+
+    def action_amounts(self, rows, cur, other):
+        # PokerEnv.action_amounts as masked array operations, one row per table
+        cur_stack = self.stack_size[rows, cur]
+        other_stack = self.stack_size[rows, other]
+        pot = self.pot[rows]
+        amount = self.total_bet[rows, other] - self.total_bet[rows, cur]
+        opening = amount == 0
+        other_position = self.position[rows, other]
+        can_fold = self.already_played[rows, other] & (other_position != CHECK) & (other_position != CALL)
+        bets = np.stack([np.where(opening, self.big_blind[rows], amount * 2),
+                         np.where(opening, (pot + 1) // 2, amount + pot // 2),
+                         np.where(opening, pot, amount + pot), np.where(opening, pot * 2, amount + pot * 2)], axis=1)
+        bets = np.where(other_stack[:, np.newaxis] < bets, (other_stack + amount)[:, np.newaxis], bets)
+        can_raise = ((amount < cur_stack) & (other_stack > 0))[:, np.newaxis] & (bets <= cur_stack[:, np.newaxis])
+        amounts = np.empty((len(rows), len(Action)), dtype=np.int64)
+        amounts[:, Action.FOLD.value] = np.where(can_fold, 0, ILLEGAL)
+        amounts[:, Action.CHECK_CALL.value] = np.minimum(amount, cur_stack)
+        amounts[:, Action.RAISE_BIG_BLIND.value:] = np.where(can_raise, bets, ILLEGAL)
+        return amounts
+
+    def step(self, actions):
+        actions = np.asarray(actions)
+        rows = self.rows
+        cur = self.current_player()
+        other = 1 - cur
+        acted = (cur == PLAYER) | self.is_playable(OPPONENT)
+        final_actions = np.full(self.num_tables, NO_ACTION, dtype=np.int64)
+        final_actions[acted] = self.perform_player_action(rows[acted], cur[acted], other[acted], actions[acted])
+        self.already_played[rows[acted], cur[acted]] = True
+
+        # a call that puts the acting player all-in runs out the board
+        all_in = (self.stack_size[rows, cur] == 0) & (self.position[rows, cur] == CALL)
+        self.community_count[all_in] = 5
+        self.already_played[all_in] = True
+
+        hand_over = self.is_hand_over()
+        player_won = np.zeros(self.num_tables, dtype=bool)
+        over_rows = np.flatnonzero(hand_over)
+        if len(over_rows):
+            won = self.is_first_player_won(over_rows)
+            player_won[over_rows] = won
+            self.hand_result[over_rows] = self.stack_size[over_rows, PLAYER] + np.where(won, self.pot[over_rows], 0) - \
+                self.hand_start_stack[over_rows]
+            self.stack_size[over_rows, np.where(won, PLAYER, OPPONENT)] += self.pot[over_rows]
+            self.reset_board(over_rows)
+        self.update_board(~hand_over & self.is_stage_ready())
+
+        game_over = self.is_game_over()
+        if game_over.any():
+            self.reset(game_over)
+        return game_over, final_actions, hand_over, player_won
+
+    def perform_player_action(self, rows, cur, other, actions):
+        amount = self.total_bet[rows, other] - self.total_bet[rows, cur]
+        opening = amount == 0
+        bet_amount = self.action_amounts(rows, cur, other)[np.arange(len(rows)), actions]
+        fold = actions == Action.FOLD.value
+        # illegal raises fall back to a call
+        is_raise = (actions >= Action.RAISE_BIG_BLIND.value) & (bet_amount != ILLEGAL)
+        call = ~fold & ~is_raise
+        final_actions = np.where(is_raise, actions, Action.CHECK_CALL.value)
+        final_actions[fold] = Action.FOLD.value
+
+        self.is_fold[rows[fold], cur[fold]] = True
+
+        raise_rows, raise_seats = rows[is_raise], cur[is_raise]
+        self.pot[raise_rows] += self.place_bet(raise_rows, raise_seats, bet_amount[is_raise])
+        self.position[raise_rows, raise_seats] = RAISE
+
+        check = call & opening
+        self.position[rows[check], cur[check]] = CHECK
+        pay = call & ~opening
+        call_rows, call_seats, call_others = rows[pay], cur[pay], other[pay]
+        self.pot[call_rows] += self.place_bet(call_rows, call_seats, amount[pay])
+        self.position[call_rows, call_seats] = CALL
+        # an all-in call for less than the bet returns the difference to the bettor
+        pot_change = self.total_bet[call_rows, call_others] - self.total_bet[call_rows, call_seats]
+        self.pot[call_rows] -= pot_change
+        self.stack_size[call_rows, call_others] += pot_change
+        self.total_bet[call_rows, call_others] -= pot_change
+        return final_actions
+
+    def is_hand_over(self):
+        showdown = SHOWDOWN[self.position[:, PLAYER], self.position[:, OPPONENT]]
+        return self.is_fold.any(axis=1) | \
+            ((self.community_count == 5) & self.already_played.all(axis=1) & showdown)
+
+    def is_stage_ready(self):
+        return self.already_played.all(axis=1) & (self.total_bet[:, PLAYER] == self.total_bet[:, OPPONENT]) & \
+            STAGE_READY[self.position[:, PLAYER], self.position[:, OPPONENT]]
+
+    def update_board(self, mask):
+        self.community_count[mask] = NEXT_STREET[self.community_count[mask]]
+        self.already_played[mask] = False
+
+    def is_first_player_won(self, rows):
+        won = self.is_fold[rows, OPPONENT] | ~self.is_fold[rows, PLAYER]
+        showdown = np.flatnonzero(~self.is_fold[rows].any(axis=1))
+        if len(showdown):
+            showdown_rows = rows[showdown]
+            board = self.board[showdown_rows]
+            hands = self.hands[showdown_rows]
+            # both seats of every showdown ranked in one call
+            scores = self.evaluator.evaluate(np.concatenate([hands, np.repeat(board[:, np.newaxis], 2, axis=1)],
+                                                            axis=2))
+            won[showdown] = scores[:, PLAYER] <= scores[:, OPPONENT]
+        return won
+
+    def is_game_over(self):
+        return ((self.stack_size < self.big_blind[:, np.newaxis]) & ~self.already_played).any(axis=1)
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from PokerModel.PokerModel.Benchmark import REGRESSION_THRESHOLD, compare, flatten, load_report, run_benchmarks, \
+    save_report
+
+
+class Command(BaseCommand):
+    help = "Benchmark the engine, the encoder, agent decisions, Game.reset and the index view, report as JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument('--scale', type=float, default=1.0, help="multiplies the number of rounds")
+        parser.add_argument('--no-web', action='store_true', help="skip the index view benchmark")
+        parser.add_argument('--compare', help="an earlier report, exits with an error when a metric regressed")
+        parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+
+    def handle(self, *args, **options):
+        report = run_benchmarks(options['scale'], web=not options['no_web'])
+        save_report(options['output'], report)
+        for metric, value in flatten(report['results']).items():
+            self.stdout.write("{:<45} {:>14.2f}".format(metric, value))
+        self.stdout.write("Saved to {}".format(options['output']))
+        if options['compare']:
+            changes = compare(report, load_report(options['compare']), options['threshold'])
+            for metric, old, new, change, regressed in changes:
+                self.stdout.write("{:<45} {:>14.2f} -> {:>14.2f} {:>+8.1%}{}".format(
+                    metric, old, new, change, "  REGRESSED" if regressed else ""))
+            regressions = [metric for metric, _, _, _, regressed in changes if regressed]
+            if regressions:
+                raise CommandError("regressed: {}".format(", ".join(regressions)))
@@ -0,0 +1,23 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from PokerModel.PokerModel.EquityTables import PREFLOP_SAMPLES, PREFLOP_TABLE_PATH, build_preflop_table
+
+
+class Command(BaseCommand):
+    help = "Precompute the heads-up preflop equity table (169 x 169 hand classes) into a memory-mapped file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=PREFLOP_TABLE_PATH)
+        parser.add_argument('--samples', type=int, default=PREFLOP_SAMPLES,
+                            help="boards sampled per suit-isomorphic matchup, the default table is approximate")
+        parser.add_argument('--exhaustive', action='store_true',
+                            help="enumerate all boards of every matchup, exact but takes hours")
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        build_preflop_table(options['path'], options['samples'], options['exhaustive'], options['workers'],
+                            options['seed'])
+        self.stdout.write("Preflop equity table written to {}".format(options['path']))
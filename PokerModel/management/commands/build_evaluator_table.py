@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from PokerModel.PokerModel.SharedEvaluator import EVALUATOR_TABLE_PATH, save_lookup_table
+
+
+class Command(BaseCommand):
+    help = "Precompute the hand evaluator lookup tables into a file that every worker memory-maps"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=EVALUATOR_TABLE_PATH)
+
+    def handle(self, *args, **options):
+        save_lookup_table(options['path'])
+        self.stdout.write("Evaluator table written to {}".format(options['path']))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from PokerModel.PokerModel.NumpyModel import export_model
+
+
+class Command(BaseCommand):
+    help = "Export the weights of a Keras model.h5 to the .npz file the NumPy runtime serves"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default='static/model.h5')
+        parser.add_argument('--destination', default='static/model.npz')
+
+    def handle(self, *args, **options):
+        model = export_model(options['source'], options['destination'])
+        self.stdout.write("Exported {} dense layers to {}".format(len(model.layers), options['destination']))
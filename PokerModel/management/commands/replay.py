@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from PokerModel.PokerModel.ModelRegistry import get_model
+from PokerModel.PokerModel.Replay import load_records, record_game, save_records, verify
+
+
+class Command(BaseCommand):
+    help = "Record seeded games into a replay corpus, or replay a corpus and check every game ends the same way"
+
+    def add_arguments(self, parser):
+        parser.add_argument('corpus', help="JSON lines file of {seed, actions, digest}")
+        parser.add_argument('--record', type=int, default=0, help="number of games to record instead of checking")
+        parser.add_argument('--first-seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['record']:
+            model = get_model()
+            seeds = range(options['first_seed'], options['first_seed'] + options['record'])
+            save_records(options['corpus'], [record_game(seed, model) for seed in seeds])
+            self.stdout.write("Recorded {} games to {}".format(options['record'], options['corpus']))
+            return
+        records = list(load_records(options['corpus']))
+        started = time.perf_counter()
+        failed = [record.seed for record in records if not verify(record)]
+        seconds = time.perf_counter() - started
+        actions = sum(len(record.actions) for record in records)
+        self.stdout.write("Replayed {} games, {} actions in {:.3f} s ({:.0f} actions/s)".format(
+            len(records), actions, seconds, actions / seconds))
+        if failed:
+            raise CommandError("games with seeds {} did not replay to their recorded state".format(failed))
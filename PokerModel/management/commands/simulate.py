@@ -0,0 +1,32 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from PokerModel.PokerModel.ModelRegistry import DEFAULT_MODEL_PATH
+from PokerModel.PokerModel.Simulation import BASELINES, NUM_TABLES, run_simulation
+from PokerModel.PokerModel.TableConfig import get_table_config, table_configs
+
+
+class Command(BaseCommand):
+    help = "Play heads-up hands between two agents, or an agent and a baseline, and report the player's bb/100"
+
+    def add_arguments(self, parser):
+        policies = "a model file or one of: {}".format(", ".join(BASELINES))
+        parser.add_argument('--player', default=DEFAULT_MODEL_PATH, help=policies)
+        parser.add_argument('--opponent', default=DEFAULT_MODEL_PATH, help=policies)
+        parser.add_argument('--hands', type=int, default=1000000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--tables', type=int, default=NUM_TABLES, help="tables stepped together by each worker")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default='simulation', help="directory of the per hand results")
+        parser.add_argument('--table', default=get_table_config().name,
+                            choices=[config.name for config in table_configs()], help="stacks and blinds of the tables")
+
+    def handle(self, *args, **options):
+        result = run_simulation(options['player'], options['opponent'], options['hands'], options['output'],
+                                options['workers'], options['tables'], options['seed'],
+                                get_table_config(options['table']))
+        self.stdout.write("{} vs {}: {:+.2f} bb/100 +/- {:.2f} (95%) over {} hands, {:.1%} to showdown".format(
+            options['player'], options['opponent'], result.bb_per_100, result.error, result.hands,
+            result.showdowns / result.hands))
+        self.stdout.write("{:.1f} s, {:.0f} hands/s".format(result.seconds, result.hands_per_second))
@@ -0,0 +1,38 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from PokerModel.PokerModel.ModelRegistry import DEFAULT_MODEL_PATH
+from PokerModel.PokerModel.Simulation import BASELINES
+from PokerModel.PokerModel.Tournament import BLIND_LEVELS, HANDS_PER_LEVEL, MAX_HANDS, TournamentConfig, \
+    run_tournament
+from PokerModel.PokerModel.TableConfig import get_table_config, table_configs
+
+
+class Command(BaseCommand):
+    help = "Play a single elimination heads-up tournament with rising blinds and report its throughput"
+
+    def add_arguments(self, parser):
+        policies = "model files or baselines ({})".format(", ".join(BASELINES))
+        parser.add_argument('--entrants', nargs='+', default=[DEFAULT_MODEL_PATH, 'random', 'call'],
+                            help="policies of the entrants, " + policies + ", repeated up to --size")
+        parser.add_argument('--size', type=int, default=1024, help="number of entrants")
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--table', default=get_table_config().name,
+                            choices=[config.name for config in table_configs()],
+                            help="stacks and first level blinds of the tables")
+        parser.add_argument('--hands-per-level', type=int, default=HANDS_PER_LEVEL)
+        parser.add_argument('--max-hands', type=int, default=MAX_HANDS)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        specs = [options['entrants'][entrant % len(options['entrants'])] for entrant in range(options['size'])]
+        config = TournamentConfig(get_table_config(options['table']), BLIND_LEVELS, options['hands_per_level'],
+                                  options['max_hands'])
+        result = run_tournament(specs, options['workers'], options['seed'], config)
+        self.stdout.write("Champion: entrant {} ({}) after {} rounds".format(result.champion, specs[result.champion],
+                                                                            result.rounds))
+        self.stdout.write("{} tables, {} hands, {} decisions in {:.1f} s".format(result.matches, result.hands,
+                                                                                 result.decisions, result.seconds))
+        self.stdout.write("{:.1f} tables/s, {:.0f} hands/s".format(result.tables_per_second,
+                                                                  result.hands_per_second))
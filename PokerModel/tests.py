@@ -1,3 +1,913 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import pickle
+import random
+import tempfile
+import threading
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase
+from treys import Card, Deck, Evaluator
+
+from PokerModel.PokerModel.BatchEvaluator import BatchEvaluator
+from PokerModel.PokerModel.Benchmark import compare, flatten, run_benchmarks
+from PokerModel.PokerModel.Cards import CARD_FEATURES, CARD_IDS, CARD_INTS, DECK_BATCH, DeckStream, \
+    cards_to_image_files, draw_orders
+from PokerModel.PokerModel.Enums import Action, Position
+from PokerModel.PokerModel.Equity import estimate_equity, hand_class_combos
+from PokerModel.PokerModel.EquityTables import CLASS_INDEX, HAND_CLASSES, PreflopTable, class_matchups
+from PokerModel.PokerModel.HandState import HandState, get_hand_tables
+from PokerModel.PokerModel.HandHistory import HandHistoryLogger, HandRecorder, read_events, read_hands
+from PokerModel.PokerModel.Game import Game, get_observation
+from PokerModel.PokerModel.InferenceServer import InferenceServer
+from PokerModel.PokerModel.ModelRegistry import ModelRegistry
+from PokerModel.PokerModel import Metrics
+from PokerModel.PokerModel.NumpyModel import NumpyModel, export_model
+from PokerModel.PokerModel.ObservationEncoder import ObservationEncoder
+from PokerModel.PokerModel.PokerEnv import PokerEnv, ILLEGAL, SNAPSHOT_SIZE, TABLE_RECORD
+from PokerModel.PokerModel.Player import Player
+from PokerModel.PokerModel.Simulation import read_results, run_simulation
+from PokerModel.PokerModel.Tournament import BLIND_LEVELS, MAX_HANDS, Match, TournamentConfig, run_tournament
+from PokerModel.PokerModel.Replay import digest, record_game, replay, verify
+from PokerModel.PokerModel.SharedEvaluator import MappedEvaluator, save_lookup_table
+from PokerModel.PokerModel.TableConfig import BIG_BLIND, DEFAULT_TABLE_CONFIG, INITIAL_STACK_SIZE, TableConfig, \
+    get_table_config, register_table_config
+from PokerModel.PokerModel.VecPokerEnv import VecPokerEnv, NO_ACTION, table_rngs
+
+
+def play_random_actions(env, count, seed=0):
+    rng = random.Random(seed)
+    for _ in range(count):
+        if env.check_if_playable(env.player, env.opponent):
+            env.execute_player_action(env.player, env.opponent, rng.randrange(6))
+        else:
+            env.execute_player_action(env.opponent, env.player, rng.randrange(6))
+        if env.is_game_over():
+            env.reset()
+
+
+def env_state(env):
+    players = [(player.stack_size, player.hand, player.total_bet, player.previous_bet, player.position,
+                player.is_small_blind, player.is_fold, player.already_played)
+               for player in (env.player, env.opponent)]
+    return env.pot, env.community_cards, env.deck.cards, players
+
+
+class SnapshotTests(SimpleTestCase):
+
+    def test_round_trip_fresh_env(self):
+        env = PokerEnv()
+        restored = PokerEnv.from_bytes(env.to_bytes())
+        self.assertEqual(env_state(env), env_state(restored))
+
+    def test_round_trip_through_many_states(self):
+        env = PokerEnv()
+        for seed in range(200):
+            play_random_actions(env, 3, seed)
+            data = env.to_bytes()
+            self.assertEqual(len(data), SNAPSHOT_SIZE)
+            restored = PokerEnv.from_bytes(data)
+            self.assertEqual(env_state(env), env_state(restored))
+            self.assertEqual(data, restored.to_bytes())
+
+    def test_restored_env_deals_the_same_cards(self):
+        env = PokerEnv()
+        restored = PokerEnv.from_bytes(env.to_bytes())
+        # check/call through the flop and turn, the board comes from the restored deck
+        for _ in range(4):
+            for cur_env in (env, restored):
+                if cur_env.check_if_playable(cur_env.player, cur_env.opponent):
+                    cur_env.execute_player_action(cur_env.player, cur_env.opponent, 1)
+                else:
+                    cur_env.execute_player_action(cur_env.opponent, cur_env.player, 1)
+        self.assertEqual(len(env.community_cards), 4)
+        self.assertEqual(env.to_bytes(), restored.to_bytes())
+
+    def test_player_round_trip(self):
+        player = Player(57, True)
+        player.receive_cards(PokerEnv().deck.draw(2))
+        player.place_bet(13)
+        player.is_fold = True
+        restored = Player.from_bytes(player.to_bytes())
+        self.assertEqual([getattr(player, slot) for slot in Player.__slots__],
+                         [getattr(restored, slot) for slot in Player.__slots__])
+
+    def test_rejects_bad_snapshots(self):
+        data = PokerEnv().to_bytes()
+        with self.assertRaises(ValueError):
+            PokerEnv.from_bytes(data[:-1])
+        with self.assertRaises(ValueError):
+            PokerEnv.from_bytes(b'\xff' + data[1:])
+
+    def test_round_trip_keeps_the_table_config(self):
+        env = PokerEnv(rng=np.random.default_rng(2), config=get_table_config('deep'))
+        play_random_actions(env, 4)
+        restored = PokerEnv.from_bytes(env.to_bytes())
+        self.assertEqual(restored.config, get_table_config('deep'))
+        self.assertEqual(env_state(env), env_state(restored))
+        game = Game()
+        game.reset(1)
+        game.env.config = TableConfig('custom', 300, 2, 4)
+        self.assertEqual(pickle.loads(pickle.dumps(game)).env.config, game.env.config)
+
+    def test_reads_version_1_snapshots_as_default_tables(self):
+        env = PokerEnv()
+        data = env.to_bytes()
+        restored = PokerEnv.from_bytes(b'\x01' + data[1:SNAPSHOT_SIZE - TABLE_RECORD.size])
+        self.assertEqual(restored.config, DEFAULT_TABLE_CONFIG)
+        self.assertEqual(env_state(env), env_state(restored))
+
+    def test_snapshot_is_much_smaller_than_pickle(self):
+        env = PokerEnv()
+        play_random_actions(env, 4)
+        self.assertLess(len(env.to_bytes()) * 10, len(pickle.dumps(env)))
+
+
+class PlayerCoreTests(SimpleTestCase):
+
+    def test_position_wraps_the_int_code(self):
+        player = Player(INITIAL_STACK_SIZE, True)
+        self.assertFalse(hasattr(player, '__dict__'))
+        player.position = Position.RAISE
+        self.assertEqual(player.position_id, Position.RAISE.value)
+        self.assertIs(player.position, Position.RAISE)
+        restored = pickle.loads(pickle.dumps(player))
+        self.assertIs(restored.position, Position.RAISE)
+        self.assertEqual(Player.from_bytes(player.to_bytes()).position_id, player.position_id)
+
+
+def treys_ranks(evaluator, hands):
+    return np.array([evaluator.evaluate([CARD_INTS[card] for card in hand[:2]],
+                                        [CARD_INTS[card] for card in hand[2:]]) for hand in hands])
+
+
+class BatchEvaluatorTests(SimpleTestCase):
+
+    def setUp(self):
+        self.evaluator = Evaluator()
+        self.batch_evaluator = BatchEvaluator(self.evaluator.table)
+        self.rng = np.random.default_rng(0)
+
+    def random_hands(self, num_hands, size):
+        return np.argsort(self.rng.random((num_hands, 52)), axis=1)[:, :size]
+
+    def test_matches_treys_on_random_hands(self):
+        for size in (5, 6, 7):
+            hands = self.random_hands(20000, size)
+            np.testing.assert_array_equal(self.batch_evaluator.evaluate(hands), treys_ranks(self.evaluator, hands))
+
+    def test_matches_treys_on_flush_hands(self):
+        # seven distinct ranks, most of them spades, so flushes and straight flushes are common
+        ranks = np.argsort(self.rng.random((20000, 13)), axis=1)[:, :7]
+        suits = np.where(self.rng.random((20000, 7)) < 0.8, 0, self.rng.integers(1, 4, (20000, 7)))
+        hands = ranks * 4 + suits
+        np.testing.assert_array_equal(self.batch_evaluator.evaluate(hands), treys_ranks(self.evaluator, hands))
+
+    def test_mapped_tables_give_the_same_ranks(self):
+        hands = self.random_hands(5000, 7)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'table.npy')
+            save_lookup_table(path, self.evaluator.table)
+            mapped = BatchEvaluator(MappedEvaluator(path).table)
+            np.testing.assert_array_equal(mapped.evaluate(hands), self.batch_evaluator.evaluate(hands))
+
+
+class HandStateTests(SimpleTestCase):
+
+    def test_street_ranks_match_treys(self):
+        evaluator = Evaluator()
+        rng = random.Random(5)
+        for _ in range(500):
+            cards = rng.sample(Deck.GetFullDeck(), 9)
+            player, opponent, board = cards[:2], cards[2:4], cards[4:]
+            state = HandState(player, opponent)
+            self.assertIsNone(state.ranks)
+            for dealt in ([board[:3]], [board[3:4]], [board[4:]]):
+                state.add_board_cards(dealt[0])
+            for size in (3, 4, 5):
+                self.assertEqual(state.street_ranks[size], (evaluator.evaluate(board[:size], player),
+                                                            evaluator.evaluate(board[:size], opponent)))
+
+    def test_draws(self):
+        cards = [Card.new(card) for card in ('Ah', 'Kh', '2c', '3c', 'Qh', 'Jh', '4d')]
+        state = HandState(cards[:2], cards[2:4], cards[4:7])
+        # four hearts and a gutshot to the broadway, an open ended 2-3-4-5
+        self.assertEqual(state.draws(0), (True, 1))
+        self.assertEqual(state.draws(1), (False, 0))
+        state.add_board_cards([Card.new('5s')])
+        self.assertEqual(state.draws(1), (False, 2))
+        state.add_board_cards([Card.new('Th')])
+        self.assertEqual(state.draws(0), (False, 0))
+
+    def test_env_keeps_it_through_snapshots(self):
+        env = PokerEnv(rng=np.random.default_rng(2))
+        env.update_all_in_stage()
+        restored = PokerEnv.from_bytes(env.to_bytes())
+        self.assertEqual(restored.hand_state.ranks, env.hand_state.ranks)
+        self.assertEqual(pickle.loads(pickle.dumps(env)).hand_state.ranks, env.hand_state.ranks)
+
+
+class SharedEvaluatorTests(SimpleTestCase):
+
+    def test_envs_share_one_set_of_hand_tables(self):
+        env = PokerEnv()
+        self.assertIs(env.hand_state.tables, PokerEnv().hand_state.tables)
+        self.assertIs(env.hand_state.tables, pickle.loads(pickle.dumps(env)).hand_state.tables)
+        self.assertIs(env.hand_state.tables, get_hand_tables())
+
+    def test_mapped_evaluator_matches_treys(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'table.npy')
+            save_lookup_table(path)
+            mapped = MappedEvaluator(path)
+            evaluator = Evaluator()
+            for seed in range(300):
+                cards = Deck(seed).draw(7)
+                self.assertEqual(evaluator.evaluate(cards[:2], cards[2:]), mapped.evaluate(cards[:2], cards[2:]))
+                self.assertEqual(evaluator.evaluate(cards[:2], cards[2:5]), mapped.evaluate(cards[:2], cards[2:5]))
+            del mapped
+
+
+def vec_env_state(vec_env, table):
+    players = [(int(vec_env.stack_size[table, seat]), [CARD_INTS[card] for card in vec_env.hands[table, seat]],
+                int(vec_env.total_bet[table, seat]), int(vec_env.previous_bet[table, seat]),
+                int(vec_env.position[table, seat]), bool(vec_env.is_small_blind[table, seat]),
+                bool(vec_env.is_fold[table, seat]), bool(vec_env.already_played[table, seat]))
+               for seat in range(2)]
+    board = [CARD_INTS[card] for card in vec_env.board[table, :vec_env.community_count[table]]]
+    return int(vec_env.pot[table]), board, players
+
+
+def scalar_env_state(env):
+    pot, community_cards, _, players = env_state(env)
+    return pot, community_cards, [player[:4] + (player[4].value,) + player[5:] for player in players]
+
+
+class LegalActionsTests(SimpleTestCase):
+
+    def seat_to_act(self, env):
+        if env.check_if_playable(env.player, env.opponent):
+            return env.player, env.opponent
+        return env.opponent, env.player
+
+    def test_actions_put_in_their_amount(self):
+        env = PokerEnv(rng=np.random.default_rng(6))
+        action_rng = np.random.default_rng(6)
+        for _ in range(2000):
+            cur_player, other_player = self.seat_to_act(env)
+            amounts = env.legal_actions(cur_player, other_player)
+            action = int(action_rng.integers(0, 6))
+            pot, bet = env.pot, cur_player.total_bet
+            done, action_taken, winner = env.execute_player_action(cur_player, other_player, action)
+            if not winner and amounts[action] != ILLEGAL and action >= Action.RAISE_BIG_BLIND.value:
+                self.assertEqual(action_taken, Action(action).name)
+                self.assertEqual(cur_player.total_bet - bet, amounts[action])
+                self.assertEqual(env.pot - pot, amounts[action])
+            elif action >= Action.RAISE_BIG_BLIND.value:
+                # a raise that cannot be made is played as a call
+                self.assertEqual(action_taken, Action.CHECK_CALL.name)
+            if done:
+                env.reset()
+
+    def test_fold_is_only_legal_facing_a_bet(self):
+        env = PokerEnv(rng=np.random.default_rng(0))
+        cur_player, other_player = self.seat_to_act(env)
+        self.assertEqual(env.legal_actions(cur_player, other_player)[Action.FOLD.value], ILLEGAL)
+        env.execute_player_action(cur_player, other_player, Action.RAISE_POT.value)
+        self.assertEqual(env.legal_actions(other_player, cur_player)[Action.FOLD.value], 0)
+
+    def test_valid_actions_wrapper(self):
+        env = PokerEnv(rng=np.random.default_rng(0))
+        cur_player, other_player = self.seat_to_act(env)
+        self.assertEqual(env.get_player_valid_actions(other_player), [1, 2, 3, 4, 5])
+        env.execute_player_action(cur_player, other_player, Action.RAISE_POT.value)
+        self.assertEqual(env.get_player_valid_actions(cur_player), [0, 1, 2, 3, 4, 5])
+
+    def test_vec_env_matches_scalar_env(self):
+        num_tables = 20
+        vec_env = VecPokerEnv(num_tables, seed=5)
+        envs = [PokerEnv(rng=rng) for rng in table_rngs(5, num_tables)]
+        action_rng = np.random.default_rng(5)
+        for _ in range(300):
+            legal = vec_env.legal_actions()
+            actions = action_rng.integers(0, 6, num_tables)
+            vec_env.step(actions)
+            for table, env in enumerate(envs):
+                cur_player, other_player = self.seat_to_act(env)
+                np.testing.assert_array_equal(env.legal_actions(cur_player, other_player), legal[table])
+                if env.execute_player_action(cur_player, other_player, actions[table])[0]:
+                    env.reset()
+
+
+class VecPokerEnvTests(SimpleTestCase):
+
+    def test_matches_scalar_env_with_same_seeds(self):
+        num_tables = 20
+        vec_env = VecPokerEnv(num_tables, seed=3)
+        envs = [PokerEnv(rng=rng) for rng in table_rngs(3, num_tables)]
+        action_rng = np.random.default_rng(0)
+        for _ in range(500):
+            actions = action_rng.integers(0, 6, num_tables)
+            game_over, final_actions, _, _ = vec_env.step(actions)
+            for table, env in enumerate(envs):
+                if env.check_if_playable(env.player, env.opponent):
+                    done, action_taken, _ = env.execute_player_action(env.player, env.opponent, actions[table])
+                else:
+                    done, action_taken, _ = env.execute_player_action(env.opponent, env.player, actions[table])
+                self.assertEqual(done, game_over[table])
+                expected = Action[action_taken].value if action_taken else NO_ACTION
+                self.assertEqual(expected, final_actions[table])
+                if done:
+                    env.reset()
+                self.assertEqual(scalar_env_state(env), vec_env_state(vec_env, table))
+
+    def test_chips_are_conserved(self):
+        vec_env = VecPokerEnv(100, seed=1)
+        action_rng = np.random.default_rng(1)
+        for _ in range(300):
+            vec_env.step(action_rng.integers(0, 6, 100))
+            totals = vec_env.stack_size.sum(axis=1) + vec_env.pot
+            self.assertTrue((totals == 2 * INITIAL_STACK_SIZE).all())
+
+    def test_raising_into_an_all_in_player_does_not_stall_tables(self):
+        vec_env = VecPokerEnv(64, seed=2)
+        action_rng = np.random.default_rng(2)
+        last_hand_over = np.zeros(64, dtype=np.int64)
+        for step in range(3000):
+            _, _, hand_over, _ = vec_env.step(action_rng.integers(0, 6, 64))
+            last_hand_over[hand_over] = step
+        self.assertGreater(last_hand_over.min(), 2500)
+
+    def test_hand_result_is_the_player_stack_change(self):
+        vec_env = VecPokerEnv(50, seed=4)
+        action_rng = np.random.default_rng(4)
+        for _ in range(300):
+            start_stack = vec_env.hand_start_stack.copy()
+            game_over, _, hand_over, _ = vec_env.step(action_rng.integers(0, 6, 50))
+            # a new hand starts from the stack the last one ended with
+            rows = np.flatnonzero(hand_over & ~game_over)
+            np.testing.assert_array_equal(vec_env.hand_start_stack[rows] - start_stack[rows],
+                                          vec_env.hand_result[rows])
+
+
+class InferenceServerTests(SimpleTestCase):
+
+    def test_batches_concurrent_requests(self):
+        weights = np.arange(133 * 6, dtype=np.float32).reshape(133, 6) / 1000
+        calls = []
+
+        def model(batch):
+            calls.append(len(batch))
+            return batch[:, 0, :] @ weights
+
+        server = InferenceServer(lambda: model, max_batch_size=16, max_wait=0.05)
+        observations = np.random.default_rng(0).random((40, 133))
+        results = [None] * len(observations)
+
+        def decide(i):
+            results[i] = server.predict(observations[i])
+
+        threads = [threading.Thread(target=decide, args=(i,)) for i in range(len(observations))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        server.stop()
+        np.testing.assert_allclose(np.array(results), observations.astype(np.float32) @ weights, rtol=1e-6)
+        self.assertLessEqual(max(calls), 16)
+        self.assertLess(len(calls), len(observations))
+        metrics = server.metrics()
+        self.assertEqual(metrics["requests"], len(observations))
+        self.assertEqual(metrics["batches"], len(calls))
+
+
+def reference_cards_dictionary():
+    # the treys int -> (value, colour) dictionary Game.reset() used to build
+    auxiliary_dic = {"T": 10, "J": 11, "Q": 12, "K": 13, "A": 1, "h": 1, "d": 2, "c": 3, "s": 4}
+    dictionary = {}
+    for n in [str(x) for x in range(2, 10)] + ["T", "J", "Q", "K", "A"]:
+        for c in ["h", "d", "c", "s"]:
+            dictionary[Card.new(n + c)] = (int(auxiliary_dic.get(n, n)), auxiliary_dic[c])
+    return dictionary
+
+
+def reference_cards_representation(cards_dictionary, cur_cards, num_of_cards):
+    card_representation = np.zeros((num_of_cards, 17), dtype=np.float32)
+    for i, card in enumerate(cur_cards):
+        card_representation[i, cards_dictionary[card][0] - 1] = 1
+        card_representation[i, 13 + cards_dictionary[card][1] - 1] = 1
+    return card_representation
+
+
+def reference_position_representation(cur_player, other_player):
+    position_representation = np.zeros((2, 5), dtype=np.float32)
+    position_representation[0, cur_player.position.value] = 1
+    position_representation[0, other_player.position.value] = 1
+    return position_representation
+
+
+def reference_observation(env, cards_dictionary, cur_player, other_player):
+    # the hstack based encoding the agent was trained with
+    observation = (
+        reference_cards_representation(cards_dictionary, cur_player.get_hand(), 2),
+        reference_position_representation(cur_player, other_player),
+        reference_cards_representation(cards_dictionary, env.community_cards, 5),
+        np.array([env.pot / INITIAL_STACK_SIZE * 2]),
+        np.array([cur_player.stack_size / (INITIAL_STACK_SIZE * 2), other_player.stack_size / (INITIAL_STACK_SIZE * 2)]),
+        np.array((other_player.total_bet - cur_player.total_bet) / INITIAL_STACK_SIZE),
+    )
+    return np.hstack([obs.flatten() for obs in observation])
+
+
+class ObservationEncoderTests(SimpleTestCase):
+
+    def setUp(self):
+        self.cards_dictionary = reference_cards_dictionary()
+        self.encoder = ObservationEncoder()
+
+    def test_matches_reference_encoding(self):
+        env = PokerEnv()
+        for seed in range(200):
+            play_random_actions(env, 2, seed)
+            for cur_player, other_player in ((env.player, env.opponent), (env.opponent, env.player)):
+                expected = reference_observation(env, self.cards_dictionary, cur_player, other_player)
+                encoded = self.encoder.encode(env, cur_player, other_player)
+                self.assertEqual(expected.astype(np.float32).tobytes(), encoded.tobytes())
+                self.assertEqual(expected.astype(np.float32).tobytes(),
+                                 get_observation(env, cur_player, other_player).tobytes())
+
+    def test_batch_rows_match_single_encoding(self):
+        envs = [PokerEnv() for _ in range(10)]
+        for seed, env in enumerate(envs):
+            play_random_actions(env, seed, seed)
+        batch = self.encoder.encode_batch([(env, env.opponent, env.player) for env in envs])
+        for row, env in enumerate(envs):
+            self.assertEqual(batch[row].tobytes(), self.encoder.encode(env, env.opponent, env.player).tobytes())
+
+    def test_vec_env_tables_match_scalar_encoding(self):
+        num_tables = 10
+        vec_env = VecPokerEnv(num_tables, seed=5)
+        envs = [PokerEnv(rng=rng) for rng in table_rngs(5, num_tables)]
+        action_rng = np.random.default_rng(5)
+        for _ in range(50):
+            seats = vec_env.current_player()
+            batch = self.encoder.encode_tables(vec_env, seats)
+            for table, env in enumerate(envs):
+                players = (env.player, env.opponent)
+                expected = self.encoder.encode(env, players[seats[table]], players[1 - seats[table]])
+                self.assertEqual(expected.tobytes(), batch[table].tobytes())
+            actions = action_rng.integers(0, 6, num_tables)
+            vec_env.step(actions)
+            for table, env in enumerate(envs):
+                if env.check_if_playable(env.player, env.opponent):
+                    done, _, _ = env.execute_player_action(env.player, env.opponent, actions[table])
+                else:
+                    done, _, _ = env.execute_player_action(env.opponent, env.player, actions[table])
+                if done:
+                    env.reset()
+
+
+class TableConfigTests(SimpleTestCase):
+    configs = [DEFAULT_TABLE_CONFIG, TableConfig('test', 500, 5, 10), get_table_config('short')]
+
+    def test_env_posts_its_own_blinds(self):
+        env = PokerEnv(rng=np.random.default_rng(0), config=self.configs[1])
+        self.assertEqual(env.pot, 15)
+        self.assertEqual(env.player.stack_size + env.opponent.stack_size, 985)
+        cur_player, other_player = (env.player, env.opponent) if env.player.is_small_blind else \
+            (env.opponent, env.player)
+        self.assertEqual(env.legal_actions(cur_player, other_player)[Action.RAISE_BIG_BLIND.value], 10)
+
+    def test_registry(self):
+        self.assertEqual(get_table_config(), DEFAULT_TABLE_CONFIG)
+        self.assertEqual(get_table_config('default'), DEFAULT_TABLE_CONFIG)
+        config = register_table_config(TableConfig('registry test', 200, 2, 4))
+        self.assertEqual(register_table_config(TableConfig('registry test', 200, 2, 4)), config)
+        self.assertIs(get_table_config('registry test'), config)
+        with self.assertRaises(ValueError):
+            register_table_config(TableConfig('registry test', 200, 5, 10))
+        with self.assertRaises(ValueError):
+            get_table_config('missing')
+
+    def test_mixed_vec_env_matches_scalar_tables(self):
+        num_tables = 9
+        configs = [self.configs[table % len(self.configs)] for table in range(num_tables)]
+        vec_env = VecPokerEnv(num_tables, seed=4, configs=configs)
+        envs = [PokerEnv(rng=rng, config=config) for rng, config in zip(table_rngs(4, num_tables), configs)]
+        encoder = ObservationEncoder()
+        action_rng = np.random.default_rng(4)
+        for _ in range(200):
+            seats = vec_env.current_player()
+            batch = encoder.encode_tables(vec_env, seats)
+            for table, env in enumerate(envs):
+                self.assertEqual(vec_env_state(vec_env, table), scalar_env_state(env))
+                players = (env.player, env.opponent)
+                expected = encoder.encode(env, players[seats[table]], players[1 - seats[table]])
+                self.assertEqual(expected.tobytes(), batch[table].tobytes())
+            actions = action_rng.integers(0, 6, num_tables)
+            vec_env.step(actions)
+            for table, env in enumerate(envs):
+                if env.check_if_playable(env.player, env.opponent):
+                    done, _, _ = env.execute_player_action(env.player, env.opponent, actions[table])
+                else:
+                    done, _, _ = env.execute_player_action(env.opponent, env.player, actions[table])
+                if done:
+                    env.reset()
+
+    def test_chips_are_measured_in_starting_stacks(self):
+        # a fresh table reads the same in every config with the same stack to blind ratio
+        small = PokerEnv(rng=np.random.default_rng(1))
+        large = PokerEnv(rng=np.random.default_rng(1), config=self.configs[1]._replace(small_blind=5, big_blind=10))
+        batch = ObservationEncoder().encode_batch([(small, small.player, small.opponent),
+                                                   (large, large.player, large.opponent)])
+        self.assertEqual(batch[0].tobytes(), batch[1].tobytes())
+
+    def test_vec_env_needs_a_config_per_table(self):
+        with self.assertRaises(ValueError):
+            VecPokerEnv(3, configs=self.configs[:2])
+
+
+class CardLookupTests(SimpleTestCase):
+
+    def test_card_features_match_dictionary(self):
+        cards_dictionary = reference_cards_dictionary()
+        for card, features in cards_dictionary.items():
+            self.assertEqual(tuple(CARD_FEATURES[CARD_IDS[card]]), features)
+
+    def test_image_files(self):
+        cards = [Card.new('Ts'), Card.new('Ah'), Card.new('7c')]
+        self.assertEqual(cards_to_image_files(cards, 5), ['Images/10_of_spades.png', 'Images/ace_of_hearts.png',
+                                                          'Images/7_of_clubs.png', 'Images/cover.png',
+                                                          'Images/cover.png'])
+        self.assertEqual(cards_to_image_files(cards[:2], show_cards=False), ['Images/cover.png'] * 2)
+        self.assertEqual(cards_to_image_files([]), ['Images/cover.png'] * 2)
+
+    def test_deck_stream_deals_the_drawn_orders_across_batches(self):
+        decks = DeckStream(np.random.default_rng(6))
+        rng = np.random.default_rng(6)
+        expected = np.concatenate([draw_orders(rng), draw_orders(rng)])
+        for order in expected[:DECK_BATCH + 3]:
+            self.assertEqual([CARD_IDS[card] for card in decks.deck().cards], list(order[::-1]))
+        # a restored stream deals the orders it had not dealt yet, then draws the next batch like the original
+        restored = pickle.loads(pickle.dumps(decks))
+        self.assertEqual([restored.order() for _ in range(DECK_BATCH)], [decks.order() for _ in range(DECK_BATCH)])
+
+
+class NumpyModelTests(SimpleTestCase):
+
+    def test_export_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'model.npz')
+            model = export_model('static/model.h5', path)
+            restored = NumpyModel.load(path)
+        observations = np.random.default_rng(0).random((20, 1, 133))
+        np.testing.assert_array_equal(model(observations), restored(observations))
+
+    def test_export_leaves_no_temporary_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            export_model('static/model.h5', os.path.join(directory, 'model.npz'))
+            self.assertEqual(os.listdir(directory), ['model.npz'])
+
+    def test_truncated_file_keeps_the_loaded_model(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'model.npz')
+            export_model('static/model.h5', path)
+            registry = ModelRegistry(path, backend='numpy', reload_check_interval=0)
+            model = registry.get_model()
+            with open(path, 'r+b') as model_file:
+                model_file.truncate(os.path.getsize(path) // 2)
+            # a newer modification time, as a copy still in progress would have
+            os.utime(path, (registry.model_mtime + 10, registry.model_mtime + 10))
+            with self.assertLogs('PokerModel.PokerModel.ModelRegistry', 'ERROR'):
+                self.assertFalse(registry.reload_if_changed())
+            self.assertIs(registry.get_model(), model)
+
+    def test_matches_keras_q_values(self):
+        from tensorflow import keras
+
+        keras_model = keras.models.load_model('static/model.h5')
+        model = NumpyModel.load('static/model.npz')
+        observations = np.random.default_rng(0).random((100, 1, 133)).astype(np.float32)
+        np.testing.assert_allclose(model(observations), np.asarray(keras_model(observations)), atol=1e-5)
+
+
+class EquityTests(SimpleTestCase):
+
+    def test_known_preflop_equities(self):
+        aces = estimate_equity(['As', 'Ah'], seed=1)
+        self.assertAlmostEqual(aces.equity, 0.852, delta=2 * aces.error)
+        coin_flip = estimate_equity(['As', 'Ks'], opponent_range=['QQ'], seed=1)
+        self.assertAlmostEqual(coin_flip.equity, 0.46, delta=2 * coin_flip.error)
+        self.assertAlmostEqual(coin_flip.win + coin_flip.tie + coin_flip.lose, 1.0)
+
+    def test_river_is_exact(self):
+        result = estimate_equity(['As', 'Ks'], ['Qs', 'Js', 'Ts', '2d', '3c'], opponent_range=[('Ah', 'Ad')])
+        self.assertEqual((result.win, result.error), (1.0, 0.0))
+
+    def test_same_seed_same_result_with_any_worker_count(self):
+        single = estimate_equity(['7h', '8h'], ['9h', 'Tc', '2s'], target_error=0.02, seed=7)
+        pooled = estimate_equity(['7h', '8h'], ['9h', 'Tc', '2s'], target_error=0.02, seed=7, workers=2)
+        self.assertEqual(single, pooled)
+
+    def test_hand_classes(self):
+        self.assertEqual([len(hand_class_combos(hand)) for hand in ('QQ', 'AKs', 'AKo', 'AK')], [6, 4, 12, 16])
+        with self.assertRaises(ValueError):
+            estimate_equity(['As', 'Ah'], opponent_range=[('As', 'Kd')])
+
+
+class EquityTablesTests(SimpleTestCase):
+
+    def test_hand_classes(self):
+        self.assertEqual(len(HAND_CLASSES), 169)
+        self.assertEqual(sorted(np.bincount(CLASS_INDEX[CLASS_INDEX >= 0])), [8] * 78 + [12] * 13 + [24] * 78)
+        ace, king = Card.new('As'), Card.new('Kd')
+        self.assertEqual(HAND_CLASSES[CLASS_INDEX[CARD_IDS[ace], CARD_IDS[king]]], 'AKo')
+
+    def test_suit_isomorphic_matchups(self):
+        counts = class_matchups(HAND_CLASSES.index('AKs'), HAND_CLASSES.index('QQ'))
+        self.assertEqual(sum(counts.values()), 4 * 6)
+        # the queens either share a suit with the suited ace-king or they do not
+        self.assertEqual(sorted(counts.values()), [12, 12])
+
+    def test_lookups(self):
+        table = np.zeros((2, 169, 169), dtype=np.float32)
+        aces, kings = HAND_CLASSES.index('AA'), HAND_CLASSES.index('KK')
+        table[0, aces, kings], table[0, kings, aces] = 0.82, 0.18
+        table[1, aces, kings] = table[1, kings, aces] = 36
+        table[0, aces, aces], table[1, aces, aces] = 0.5, 12
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'preflop.npy')
+            np.save(path, table)
+            with np.errstate(all='raise'):
+                preflop = PreflopTable(path)
+            self.assertAlmostEqual(preflop.equity(['Ad', 'Ac'], ['Ks', 'Kh']), 0.82, places=6)
+            self.assertAlmostEqual(preflop.equity(['Ks', 'Kh']), 0.18 * 36 / 36, places=6)
+            self.assertAlmostEqual(preflop.equity(['Ad', 'Ac']), (0.82 * 36 + 0.5 * 12) / 48, places=6)
+            # no combos of queens in the table
+            self.assertEqual(preflop.equity(['Qs', 'Qh']), 0.5)
+            del preflop
+
+
+class SimulationTests(SimpleTestCase):
+
+    def test_every_hand_is_written_and_runs_repeat(self):
+        with tempfile.TemporaryDirectory() as directory:
+            result = run_simulation('static/model.npz', 'random', 3001, directory, workers=2, num_tables=32, seed=5)
+            hands = np.concatenate(list(read_results(directory)))
+            self.assertEqual(result.hands, 3001)
+            self.assertEqual(len(hands), 3001)
+            self.assertEqual(result.showdowns, hands['showdown'].sum())
+            self.assertAlmostEqual(result.bb_per_100, hands['chips'].mean() / BIG_BLIND * 100)
+            self.assertTrue((hands['won'] == (hands['chips'] > 0))[hands['chips'] != 0].all())
+            again = run_simulation('static/model.npz', 'random', 3001, directory, workers=2, num_tables=32, seed=5)
+            self.assertEqual(again.bb_per_100, result.bb_per_100)
+
+    def test_identical_policies_break_even(self):
+        with tempfile.TemporaryDirectory() as directory:
+            result = run_simulation('call', 'call', 2000, directory, num_tables=16, seed=6)
+            # two identical policies swapping seats break even within the interval
+            self.assertLess(abs(result.bb_per_100), result.error * 2)
+
+
+class HandHistoryTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'hands.log')
+        self.logger = HandHistoryLogger(self.path, flush_interval=60)
+        self.addCleanup(self.logger.close)
+
+    def play(self, envs, steps, seed=0):
+        # interleaves random actions on several tables, returns the number of hands each table finished
+        rng = random.Random(seed)
+        finished = [0] * len(envs)
+        for _ in range(steps):
+            table = rng.randrange(len(envs))
+            env = envs[table]
+            if env.check_if_playable(env.player, env.opponent):
+                done, _, winning = env.execute_player_action(env.player, env.opponent, rng.randrange(6))
+            else:
+                done, _, winning = env.execute_player_action(env.opponent, env.player, rng.randrange(6))
+            finished[table] += bool(winning)
+            if done:
+                env.reset()
+        return finished
+
+    def test_reads_back_every_hand_of_interleaved_tables(self):
+        envs = [PokerEnv(history=HandRecorder(logger=self.logger)) for _ in range(3)]
+        first_hole_cards = [env.player.hand + env.opponent.hand for env in envs]
+        finished = self.play(envs, 600)
+        self.logger.close()
+        hands = list(read_hands(self.path))
+        for env, hole_cards, count in zip(envs, first_hole_cards, finished):
+            table_hands = sorted([hand for hand in hands if hand.table_id == env.history.table_id],
+                                 key=lambda hand: hand.hand_number)
+            self.assertEqual(len(table_hands), count)
+            self.assertEqual(table_hands[0].hole_cards, hole_cards)
+            for hand in table_hands:
+                self.assertEqual(sum(hand.stacks), 2 * INITIAL_STACK_SIZE)
+                self.assertIn(len(hand.community_cards), (0, 3, 4, 5))
+                if hand.showdown:
+                    self.assertEqual(len(hand.community_cards), 5)
+                else:
+                    self.assertEqual(hand.actions[-1][1], Action.FOLD.value)
+
+    def test_partly_written_event_is_left_out(self):
+        env = PokerEnv(history=HandRecorder(logger=self.logger))
+        self.play([env], 50)
+        self.logger.close()
+        events = list(read_events(self.path))
+        with open(self.path, 'ab') as log_file:
+            log_file.write(bytes((40, 1, 2)))
+        self.assertEqual(list(read_events(self.path, chunk_size=7)), events)
+
+    def test_reward_queries_do_not_log(self):
+        env = PokerEnv()
+        env.history = mock.Mock()
+        env.player.is_fold = True
+        env.calculate_reward()
+        env.history.end_hand.assert_not_called()
+
+    def test_recorder_survives_pickling_with_the_game(self):
+        game = Game()
+        game.reset()
+        game.env.history = HandRecorder(logger=self.logger)
+        game.env.reset_board()
+        restored = pickle.loads(pickle.dumps(game))
+        self.assertEqual(restored.env.history.table_id, game.env.history.table_id)
+        self.assertEqual(restored.env.history.hand_number, 1)
+
+
+class ReplayTests(SimpleTestCase):
+
+    def setUp(self):
+        self.model = NumpyModel.load('static/model.npz')
+
+    def test_same_seed_plays_the_same_game(self):
+        self.assertEqual(record_game(7, self.model), record_game(7, self.model))
+        self.assertNotEqual(record_game(7, self.model).digest, record_game(8, self.model).digest)
+
+    def test_replay_reaches_the_recorded_state(self):
+        for seed in range(5):
+            record = record_game(seed, self.model)
+            self.assertTrue(verify(record))
+            _, steps = replay(record.seed, record.actions)
+            self.assertEqual(len(steps), len(record.actions))
+            self.assertTrue(steps[-1][2])
+
+    def test_pickled_game_continues_the_same_way(self):
+        game = Game()
+        game.reset(seed=11)
+        game.agent_model = self.model
+        for _ in range(3):
+            game.step(1)
+        restored = pickle.loads(pickle.dumps(game))
+        restored.agent_model = self.model
+        for _ in range(6):
+            game.step(1)
+            restored.step(1)
+        self.assertEqual(restored.actions, game.actions)
+        self.assertEqual(digest(restored.env), digest(game.env))
+
+
+class StepUntilPlayerTurnTests(SimpleTestCase):
+
+    def setUp(self):
+        self.model = NumpyModel.load('static/model.npz')
+
+    def test_every_call_ends_on_the_player_turn(self):
+        for seed in range(20):
+            game = Game()
+            game.reset(seed)
+            game.agent_model = self.model
+            game.step_until_player_turn()
+            player_rng = np.random.default_rng(seed)
+            while not game.done:
+                events = game.step_until_player_turn(int(player_rng.integers(6)))
+                self.assertEqual(events[0]['actor'], 'player')
+                self.assertEqual({event['actor'] for event in events[1:]} - {'agent'}, set())
+                self.assertTrue(game.done or game.is_player_turn())
+            # every step was recorded, the game replays to the same state
+            env, steps = replay(seed, game.actions)
+            self.assertEqual(digest(env), digest(game.env))
+
+    def test_only_plays_the_agent_when_it_is_not_the_player_turn(self):
+        game = Game()
+        game.reset(3)
+        game.agent_model = self.model
+        while game.is_player_turn():
+            game.step(1)
+        events = game.step_until_player_turn(5)
+        self.assertEqual({event['actor'] for event in events}, {'agent'})
+
+    def test_stepping_without_an_action_on_the_player_turn_plays_nothing(self):
+        game = Game()
+        game.reset(3)
+        game.agent_model = self.model
+        game.step_until_player_turn()
+        before = digest(game.env), bytes(game.actions)
+        self.assertIsNone(game.step(None))
+        self.assertEqual((digest(game.env), bytes(game.actions)), before)
+
+
+class TournamentTests(SimpleTestCase):
+
+    def test_blinds_rise_with_the_hands_played(self):
+        config = TournamentConfig(DEFAULT_TABLE_CONFIG, BLIND_LEVELS, 2, MAX_HANDS)
+        match = Match(0, 1, [0], config)
+        while match.winner is None:
+            seat, cur_player, other_player = match.seat_to_act()
+            match.play(cur_player, other_player, Action.FOLD.value)
+        # every fold gives the blinds away, the blinds double every two hands until a stack is too short
+        self.assertGreater(match.env.config.big_blind, BLIND_LEVELS[0][1])
+        self.assertLess(min(match.env.player.stack_size, match.env.opponent.stack_size), match.env.config.big_blind)
+
+    def test_every_hand_posts_the_blinds_of_its_level(self):
+        config = TournamentConfig(DEFAULT_TABLE_CONFIG._replace(stack_size=1000), BLIND_LEVELS, 1, MAX_HANDS)
+        match = Match(0, 1, [0], config)
+        for hands in range(len(BLIND_LEVELS) + 2):
+            small_blind, big_blind = BLIND_LEVELS[min(hands, len(BLIND_LEVELS) - 1)]
+            self.assertEqual(match.hands, hands)
+            self.assertEqual(match.env.pot, small_blind + big_blind)
+            self.assertEqual(match.env.config.big_blind, big_blind)
+            seat, cur_player, other_player = match.seat_to_act()
+            match.play(cur_player, other_player, Action.FOLD.value)
+
+    def test_bracket_plays_every_match(self):
+        specs = ['random', 'call'] * 10 + ['random']
+        result = run_tournament(specs, seed=3)
+        self.assertEqual(result.matches, len(specs) - 1)
+        self.assertEqual(result.rounds, 5)
+        self.assertIn(result.champion, range(len(specs)))
+        self.assertEqual(run_tournament(specs, seed=3).champion, result.champion)
+
+    def test_workers_split_the_rounds(self):
+        result = run_tournament(['random', 'call'] * 4, workers=2, seed=1)
+        self.assertEqual(result.matches, 7)
+        self.assertGreater(result.tables_per_second, 0)
+
+
+class BenchmarkTests(SimpleTestCase):
+
+    def test_report_has_every_metric(self):
+        report = run_benchmarks(scale=0.01, web=False)
+        metrics = flatten(report['results'])
+        for metric in ('env.hands_per_second', 'encoder.encode_us', 'decision.p50_us', 'decision.p99_us',
+                       'game_reset.cold_ms', 'game_reset.warm_p50_us', 'snapshot.to_bytes_us',
+                       'snapshot.from_bytes_us', 'showdown.batch_hands_per_second',
+                       'showdown.treys_hands_per_second', 'hand_history.action_us'):
+            self.assertGreater(metrics[metric], 0)
+        json.dumps(report)
+
+    def test_compare_knows_which_way_is_better(self):
+        baseline = {'results': {'env': {'hands_per_second': 100.0}, 'decision': {'p50_us': 10.0}}}
+        report = {'results': {'env': {'hands_per_second': 80.0}, 'decision': {'p50_us': 9.0}}}
+        regressed = {metric: flag for metric, _, _, _, flag in compare(report, baseline)}
+        self.assertEqual(regressed, {'env.hands_per_second': True, 'decision.p50_us': False})
+
+
+class MetricsTests(SimpleTestCase):
+
+    def test_histogram_renders_cumulative_buckets(self):
+        histogram = Metrics.Histogram('poker_test_seconds', "test", buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.7, 3.0):
+            histogram.observe(value)
+        lines = histogram.render()
+        self.assertIn('poker_test_seconds_bucket{le="0.1"} 1', lines)
+        self.assertIn('poker_test_seconds_bucket{le="1.0"} 3', lines)
+        self.assertIn('poker_test_seconds_bucket{le="+Inf"} 4', lines)
+        self.assertIn('poker_test_seconds_count 4', lines)
+
+    def test_timed_counts_every_call_and_samples_durations(self):
+        function = Metrics.timed('test_sampled', "test", sample_rate=0.0)(lambda x: x + 1)
+        always = Metrics.timed('test_always', "test", sample_rate=1.0)(lambda x: x * 2)
+        for i in range(10):
+            self.assertEqual(function(i), i + 1)
+            self.assertEqual(always(i), i * 2)
+        text = Metrics.render_metrics()
+        self.assertIn('poker_test_sampled_calls_total 10', text)
+        self.assertIn('poker_test_sampled_seconds_count 0', text)
+        self.assertIn('poker_test_always_seconds_count 10', text)
+
+    def test_timed_coroutine_functions_stay_coroutine_functions(self):
+        async def double(x):
+            return x * 2
+        timed_double = Metrics.timed('test_async', "test", sample_rate=1.0)(double)
+        self.assertTrue(asyncio.iscoroutinefunction(timed_double))
+        self.assertEqual(asyncio.run(timed_double(4)), 8)
+        self.assertIn('poker_test_async_seconds_count 1', Metrics.render_metrics())
+
+    def test_disabled_metrics_leave_functions_untouched(self):
+        def function():
+            pass
+        with mock.patch.object(Metrics, 'METRICS_ENABLED', False):
+            self.assertIs(Metrics.timed('test_disabled', "test")(function), function)
+
+    def test_metrics_url(self):
+        Game().reset()
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('# TYPE poker_game_reset_seconds histogram', response.content.decode())
@@ -0,0 +1,123 @@
+import pickle
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+SESSION_KEY = 'game_id'
+GAME_KEY = 'poker-game:{}'
+VERSION_KEY = 'poker-game-version:{}'
+
+
+class GameStore:
+    """
+    Two tier store of live games keyed by the Django session.
+    The first tier is an in-process LRU with a TTL, the second one is a shared Django cache
+    holding pickled games, so any worker can serve any table.
+    Every save writes a new version token, a worker only trusts its in-memory copy
+    while the token in the shared cache still matches it. The token is read again at most once
+    per version_check_interval seconds, so a table played on one worker skips the shared cache.
+    game_lock gives the lock a request holds from loading a game to storing it again.
+    """
+
+    def __init__(self, max_games=None, ttl=None, cache_alias=None, version_check_interval=None):
+        self.max_games = max_games or getattr(settings, 'GAME_STORE_MAX_GAMES', 1000)
+        self.ttl = ttl or getattr(settings, 'GAME_STORE_TTL', 60 * 60)
+        self.cache_alias = cache_alias or getattr(settings, 'GAME_STORE_CACHE', 'default')
+        if version_check_interval is None:
+            version_check_interval = getattr(settings, 'GAME_STORE_VERSION_CHECK_INTERVAL', 1.0)
+        self.version_check_interval = version_check_interval
+        # game id -> (game, version, last access time, last time the version was known to match)
+        self.games = OrderedDict()
+        self.lock = threading.Lock()
+        # game id -> lock of the requests playing it, a lock goes away with the last request holding it
+        self.game_locks = weakref.WeakValueDictionary()
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def get(self, game_id):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.games.get(game_id)
+            if entry is not None and now - entry[2] < self.ttl and now - entry[3] < self.version_check_interval:
+                self.games[game_id] = (entry[0], entry[1], now, entry[3])
+                self.games.move_to_end(game_id)
+                return entry[0]
+        version = self.cache.get(VERSION_KEY.format(game_id))
+        if version is None:
+            self.forget(game_id)
+            return None
+        with self.lock:
+            entry = self.games.get(game_id)
+            if entry is not None and entry[1] == version and now - entry[2] < self.ttl:
+                self.games[game_id] = (entry[0], version, now, now)
+                self.games.move_to_end(game_id)
+                return entry[0]
+        stored = self.cache.get(GAME_KEY.format(game_id))
+        if stored is None:
+            return None
+        version, data = stored
+        game = pickle.loads(data)
+        self.remember(game_id, game, version)
+        return game
+
+    def save(self, game_id, game):
+        version = uuid.uuid4().hex
+        data = pickle.dumps(game, protocol=pickle.HIGHEST_PROTOCOL)
+        self.cache.set_many({GAME_KEY.format(game_id): (version, data),
+                             VERSION_KEY.format(game_id): version}, timeout=self.ttl)
+        self.remember(game_id, game, version)
+
+    def delete(self, game_id):
+        self.cache.delete_many([GAME_KEY.format(game_id), VERSION_KEY.format(game_id)])
+        self.forget(game_id)
+
+    def remember(self, game_id, game, version):
+        now = time.monotonic()
+        with self.lock:
+            self.games[game_id] = (game, version, now, now)
+            self.games.move_to_end(game_id)
+            while len(self.games) > self.max_games:
+                self.games.popitem(last=False)
+            # drop expired games from the cold end
+            while self.games:
+                oldest_id, oldest = next(iter(self.games.items()))
+                if now - oldest[2] < self.ttl:
+                    break
+                del self.games[oldest_id]
+
+    def game_lock(self, game_id):
+        with self.lock:
+            lock = self.game_locks.get(game_id)
+            if lock is None:
+                lock = self.game_locks[game_id] = threading.Lock()
+            return lock
+
+    def forget(self, game_id):
+        with self.lock:
+            self.games.pop(game_id, None)
+
+    def game_id(self, request):
+        return request.session.get(SESSION_KEY)
+
+    def load(self, request):
+        game_id = self.game_id(request)
+        if game_id is None:
+            return None
+        return self.get(game_id)
+
+    def store(self, request, game):
+        game_id = self.game_id(request)
+        if game_id is None:
+            game_id = uuid.uuid4().hex
+            request.session[SESSION_KEY] = game_id
+        self.save(game_id, game)
+
+
+game_store = GameStore()
@@ -1,3 +1,196 @@
-from django.test import TestCase
+import asyncio
+import json
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+
+from PokerModel.PokerModel.Benchmark import TEST_STORAGES
+from PokerModel.PokerModel.Game import Game
+from PokerWebApp import views
+from PokerWebApp.game_store import SESSION_KEY, GameStore
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class ActionApiTests(TestCase):
+
+    def test_answers_with_the_state_delta(self):
+        page = self.client.get('/')
+        self.assertContains(page, 'data-field="player_stack"')
+        response = self.client.post('/action', {'action': 'CHECK_CALL'})
+        self.assertEqual(response.status_code, 200)
+        state = response.json()['state']
+        self.assertTrue(set(state) <= set(Game().reset()))
+        self.assertTrue(state)
+        self.assertLess(len(response.content) * 10, len(page.content))
+
+    def test_show_cards_only_changes_the_opponent_cards(self):
+        self.client.get('/')
+        state = self.client.post('/action', {'action': 'show_cards'}).json()['state']
+        self.assertEqual(set(state) - {'opponent_cards'}, {'show_opponent_cards'})
+        self.assertNotIn('Images/cover.png', state['opponent_cards'])
+
+    def test_starts_a_game_when_there_is_none(self):
+        result = self.client.post('/action', {'action': 'CHECK_CALL'}).json()
+        self.assertTrue(result['reset'])
+        self.assertEqual(set(result['state']), set(Game().reset()))
+
+    def test_only_accepts_posts(self):
+        self.assertEqual(self.client.get('/action').status_code, 405)
+
+    def test_plays_the_agent_in_the_same_request(self):
+        self.client.get('/')
+        for _ in range(20):
+            result = self.client.post('/action', {'action': 'RAISE_POT'}).json()
+            self.assertEqual(result['events'][0]['actor'], 'player')
+            if result.get('done'):
+                break
+            self.assertNotIn('player_turn', result['state'])
+
+    def test_rejects_unknown_actions(self):
+        self.client.get('/')
+        for action in ('nip', 'Fold', ''):
+            self.assertEqual(self.client.post('/action', {'action': action}).status_code, 400)
+            self.assertEqual(self.client.post('/', {'action': action}).status_code, 400)
+
+
+async def read_stream(response):
+    return b''.join([chunk async for chunk in response.streaming_content])
+
+
+def parse_events(stream):
+    # (event, data) of every server-sent event in the body
+    events = []
+    for frame in stream.decode().split("\n\n")[:-1]:
+        name, data = frame.split("\n")
+        events.append((name[len('event: '):], json.loads(data[len('data: '):])))
+    return events
+
+
+@override_settings(STORAGES=TEST_STORAGES, SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies',
+                   CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class GameLockTests(SimpleTestCase):
+    # sessions and games stay out of the database, the requests run in threads of their own like under a server
+
+    def test_overlapping_requests_play_the_table_one_at_a_time(self):
+        client = Client()
+        client.get('/')
+        playing = []
+        overlaps = []
+        play_player_step = views.play_player_step
+
+        def slow_player_step(game, action):
+            playing.append(game)
+            overlaps.append(len(playing))
+            time.sleep(0.05)
+            try:
+                return play_player_step(game, action)
+            finally:
+                playing.remove(game)
+
+        def play():
+            request_client = Client()
+            request_client.cookies = client.cookies
+            response = request_client.post('/play', {'action': 'CHECK_CALL'})
+            streams.append(parse_events(async_to_sync(read_stream)(response)))
+
+        streams = []
+        with mock.patch.object(views, 'play_player_step', slow_player_step):
+            threads = [threading.Thread(target=play) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(overlaps, [1, 1])
+        self.assertEqual([events[0][0] for events in streams], ['state', 'state'])
+        # the second request waited and played on the game the first one stored
+        game = views.game_store.get(client.session[SESSION_KEY])
+        self.assertEqual(len(game.actions), sum(len(events) for events in streams))
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class PlayStreamTests(TestCase):
+
+    async def play(self, action):
+        response = await self.async_client.post('/play', {'action': action})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return parse_events(await read_stream(response))
+
+    async def test_streams_the_agent_actions_until_the_player_acts(self):
+        await self.async_client.get('/')
+        agent_pushes = 0
+        for _ in range(20):
+            events = await self.play('RAISE_POT')
+            agent_pushes += len(events) - 1
+            if events[-1][0] == 'done':
+                break
+            self.assertEqual({name for name, _ in events}, {'state'})
+            # the stream ends on the player's turn, the turn only changes when the agent has acted in between
+            turns = [data['player_turn'] for _, data in events if 'player_turn' in data]
+            self.assertTrue(not turns or turns[-1])
+        self.assertGreater(agent_pushes, 0)
+
+    async def test_starts_a_game_when_there_is_none(self):
+        events = await self.play('CHECK_CALL')
+        self.assertEqual([name for name, _ in events], ['reset'])
+        self.assertEqual(set(events[0][1]), set(Game().reset()))
+
+    async def test_only_accepts_posts(self):
+        response = await self.async_client.get('/play')
+        self.assertEqual(response.status_code, 405)
+
+    def test_every_game_view_is_async(self):
+        # sync views would all share the one thread-sensitive executor of an ASGI worker
+        for view in (views.index, views.action, views.play):
+            self.assertTrue(asyncio.iscoroutinefunction(view), view.__name__)
+
+
+class GameStoreTests(TestCase):
+    # games only need to pickle, the store never looks inside them
+
+    def test_evicts_the_least_recently_used_game(self):
+        store = GameStore(max_games=2, ttl=60)
+        for game_id in 'abc':
+            store.save(game_id, {'id': game_id})
+        self.assertEqual(list(store.games), ['b', 'c'])
+        store.get('b')
+        store.save('d', {'id': 'd'})
+        self.assertEqual(list(store.games), ['b', 'd'])
+
+    def test_expired_games_are_read_back_from_the_cache(self):
+        store = GameStore(ttl=60)
+        game = {'id': 'a'}
+        store.save('a', game)
+        self.assertIs(store.get('a'), game)
+        now = store.games['a'][2]
+        with mock.patch('PokerWebApp.game_store.time.monotonic', return_value=now + 61):
+            restored = store.get('a')
+        self.assertIsNot(restored, game)
+        self.assertEqual(restored, game)
+
+    def test_another_worker_reads_the_game_from_the_cache(self):
+        store, other_store = GameStore(), GameStore()
+        store.save('a', {'hand': 1})
+        self.assertEqual(other_store.get('a'), {'hand': 1})
+        self.assertIsNone(other_store.get('missing'))
+
+    def test_a_fresh_copy_skips_the_shared_cache(self):
+        store = GameStore(version_check_interval=60)
+        game = {'hand': 1}
+        store.save('a', game)
+        with mock.patch.object(GameStore, 'cache') as cache:
+            self.assertIs(store.get('a'), game)
+        cache.get.assert_not_called()
+
+    def test_a_stale_copy_is_not_served_after_the_version_check(self):
+        store, other_store = GameStore(version_check_interval=0), GameStore(version_check_interval=0)
+        game = {'hand': 1}
+        store.save('a', game)
+        other_store.save('a', {'hand': 2})
+        # the version token in the cache moved on, the in-memory copy of the first worker is stale
+        self.assertEqual(store.get('a'), {'hand': 2})
+        other_store.delete('a')
+        self.assertIsNone(store.get('a'))
+        self.assertNotIn('a', store.games)
@@ -1,45 +1,226 @@
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed, JsonResponse, \
+    StreamingHttpResponse
 from django.shortcuts import render
+from PokerModel.PokerModel.Enums import Action
 from PokerModel.PokerModel.Game import Game
+from PokerModel.PokerModel.Metrics import render_metrics, timed
 from django.contrib import messages
+from .game_store import game_store
+
+render = timed('render', "Template rendering")(render)
+
+# threads running the game steps and contexts of every view, agent inference never blocks the event loop
+AGENT_THREADS = int(os.environ.get('POKER_AGENT_THREADS', 8))
+agent_executor = ThreadPoolExecutor(AGENT_THREADS, thread_name_prefix='agent')
+# the action buttons post the Action names
+PLAYER_ACTIONS = {action.name: action.value for action in Action}
+SHOW_CARDS = 'show_cards'
+# seconds between tries of a table lock held by another request
+GAME_LOCK_POLL_INTERVAL = 0.005
 
 # # Create your views here.
 
-game = Game()
+
+def create_game():
+    game = Game()
+    game.reset()
+    # the agent opens when it acts first, a new table always waits for the player
+    game.step_until_player_turn()
+    return game
+
+
+def new_game(request):
+    game = create_game()
+    game_store.store(request, game)
+    return game
+
+
+def in_agent_thread(function, *args):
+    return asyncio.get_running_loop().run_in_executor(agent_executor, function, *args)
+
+
+async def lock_game(request):
+    """
+    Waits for the lock of the session's table and returns it, None when the session has no table yet.
+    The lock is polled, so waiting for it holds neither the event loop nor an agent thread.
+    """
+    game_id = await sync_to_async(game_store.game_id)(request)
+    if game_id is None:
+        return None
+    lock = game_store.game_lock(game_id)
+    while not lock.acquire(blocking=False):
+        await asyncio.sleep(GAME_LOCK_POLL_INTERVAL)
+    return lock
+
+
+def unlock_game(lock):
+    if lock is not None:
+        lock.release()
+
+
+async def start_game(request):
+    # a new stored game and its context, the sessions and the game store hit the database so they run in a thread
+    game = await in_agent_thread(create_game)
+    await sync_to_async(game_store.store)(request, game)
+    return game, await in_agent_thread(game.create_context)
+
+
+def play_action(request, game):
+    # the player's action and the agent's answers with the context before and after them, None once the game is over
+    before = game.create_context()
+    events = player_action(request, game)
+    after = None if events is None or game.done else game.create_context()
+    return events, before, after
+
+
+async def render_page(request, context):
+    return await sync_to_async(render)(request, 'PokerWebApp/index.html', context=context)
 
 def test_html(request):
     if request.method == 'GET':
-        game.reset()
+        game = new_game(request)
         return render(request, 'PokerWebApp/index.html', context=game.create_context())
 
-def index(request):
+@timed('index', "index view requests")
+async def index(request):
     if request.method == 'GET':
-        game.reset()
-        return render(request, 'PokerWebApp/index.html', context=game.create_context())
+        game, context = await start_game(request)
+        return await render_page(request, context)
     else:
-        player_action(request)
+        # one request plays a table at a time, from loading its game to storing it
+        lock = await lock_game(request)
+        try:
+            game = await sync_to_async(game_store.load)(request)
+            if game is None:
+                # the game expired or was never started in this session
+                game, context = await start_game(request)
+                return await render_page(request, context)
+            events, _, context = await in_agent_thread(play_action, request, game)
+            if events is None:
+                return HttpResponseBadRequest("Unknown action")
+            await sync_to_async(game_store.store)(request, game)
+        finally:
+            unlock_game(lock)
         if game.done:
             messages.info(request, 'Game is Over! The winner is:' + game.get_absolute_winner())
-            return render(request, 'PokerWebApp/index.html', {"winner": game.get_absolute_winner()})
+            return await render_page(request, {"winner": game.get_absolute_winner()})
         else:
             messages.info(request, '')
-            return render(request, 'PokerWebApp/index.html', context=game.create_context())
-
-
-def player_action(request):
-    if request.method == 'POST':
-        if 'show_cards' == request.POST['action']:
-            game.flip_show_cards()
-        elif 'Fold' == request.POST['action']:
-            game.step(0)
-        elif 'CHECK_CALL' == request.POST['action']:
-            game.step(1)
-        elif 'RAISE_BIG_BLIND' == request.POST['action']:
-            game.step(2)
-        elif 'RAISE_HALF_POT' in request.POST['action']:
-            game.step(3)
-        elif 'RAISE_POT' in request.POST['action']:
-            game.step(4)
-        elif 'RAISE_TWO_POT' in request.POST['action']:
-            game.step(5)
-        else:
-            game.step(0)
+            return await render_page(request, context)
+
+
+def state_delta(before, after):
+    # the context entries an action changed
+    return {key: value for key, value in after.items() if before.get(key) != value}
+
+
+@timed('action_api', "action API requests")
+async def action(request):
+    # plays one action and answers with only what changed, the page patches itself with it
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    lock = await lock_game(request)
+    try:
+        game = await sync_to_async(game_store.load)(request)
+        if game is None:
+            game, context = await start_game(request)
+            return JsonResponse({"reset": True, "state": context})
+        events, before, after = await in_agent_thread(play_action, request, game)
+        if events is None:
+            return JsonResponse({"error": "Unknown action"}, status=400)
+        await sync_to_async(game_store.store)(request, game)
+    finally:
+        unlock_game(lock)
+    if game.done:
+        return JsonResponse({"done": True, "events": events,
+                             "message": 'Game is Over! The winner is:' + game.get_absolute_winner()})
+    return JsonResponse({"events": events, "state": state_delta(before, after)})
+
+
+def server_sent_event(event, data):
+    return "event: {}\ndata: {}\n\n".format(event, json.dumps(data))
+
+
+def play_player_step(game, action):
+    # the player's part of a streamed action, returns the context before it
+    before = game.create_context()
+    if action == SHOW_CARDS:
+        game.flip_show_cards()
+    elif game.is_player_turn() and not game.done:
+        game.step(PLAYER_ACTIONS[action])
+    return before
+
+
+async def play_events(request, game, action, lock):
+    # the player's action, then every agent action as soon as it is decided, until the player is to act again;
+    # the table stays locked until the stream ends
+    try:
+        before = await in_agent_thread(play_player_step, game, action)
+        while True:
+            await sync_to_async(game_store.store)(request, game)
+            if game.done:
+                yield server_sent_event('done',
+                                        {"message": 'Game is Over! The winner is:' + game.get_absolute_winner()})
+                return
+            after = await in_agent_thread(game.create_context)
+            yield server_sent_event('state', state_delta(before, after))
+            if game.is_player_turn():
+                return
+            before = after
+            await in_agent_thread(game.step, None)
+    finally:
+        unlock_game(lock)
+
+
+async def reset_events(context):
+    yield server_sent_event('reset', context)
+
+
+async def play(request):
+    """
+    Async version of the action endpoint for ASGI servers, the answer is a server-sent event stream.
+    No connection is held while the table waits for the player, an idle table is only its stored game.
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    action = request.POST.get('action')
+    if action != SHOW_CARDS and action not in PLAYER_ACTIONS:
+        return HttpResponseBadRequest("Unknown action")
+    # sessions and the game store hit the database, they run in a thread
+    lock = await lock_game(request)
+    try:
+        game = await sync_to_async(game_store.load)(request)
+        if game is None:
+            _, context = await start_game(request)
+    except BaseException:
+        unlock_game(lock)
+        raise
+    if game is None:
+        unlock_game(lock)
+        events = reset_events(context)
+    else:
+        # the stream releases the lock once the player is to act again
+        events = play_events(request, game, action, lock)
+    return StreamingHttpResponse(events, content_type='text/event-stream',
+                                 headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def player_action(request, game):
+    # plays the posted action and the agent's answers, returns their events or None for an unknown action
+    action = request.POST.get('action')
+    if action == SHOW_CARDS:
+        game.flip_show_cards()
+        return []
+    if action not in PLAYER_ACTIONS:
+        return None
+    return game.step_until_player_turn(PLAYER_ACTIONS[action])
+
+
+def metrics(request):
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "WebPokerGame.settings")
 
 application = get_asgi_application()
+
+# load and warm up the agent model when the worker boots, not on the first game
+from PokerModel.PokerModel.ModelRegistry import get_model
+
+get_model()
@@ -86,6 +86,23 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Live games are kept in the database cache so every gunicorn worker can serve any table.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "poker_game_cache",
+    }
+}
+
+GAME_STORE_MAX_GAMES = 1000
+GAME_STORE_TTL = 60 * 60
+# seconds a worker serves its in-memory game before checking the shared version token again
+GAME_STORE_VERSION_CHECK_INTERVAL = 1.0
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -1,4 +1,5 @@
 from django.urls import path
+from PokerModel.PokerModel.Metrics import METRICS_ENABLED
 from PokerWebApp.views import *
 
 """
@@ -23,8 +24,13 @@ from django.urls import path
 urlpatterns = [
   # path('admin/', admin.site.urls),
   path('', index),
+  path('action', action),
+  path('play', play),
   # path('test/', test_html)
 ]
 
+if METRICS_ENABLED:
+  urlpatterns.append(path('metrics', metrics))
+
 
 
@@ -0,0 +1,163 @@
+// Plays actions through the streaming play endpoint and patches the page with every state delta it pushes.
+// When the stream cannot be opened the JSON action endpoint plays the action in one response instead,
+// the forms keep working as plain POSTs when neither answers or this script does not run.
+(function () {
+    const staticUrl = document.body.dataset.staticUrl;
+    // events handled so far, an action is only resent as a form when none of its events arrived
+    let received = 0;
+
+    function csrfToken() {
+        return document.querySelector('input[name="csrfmiddlewaretoken"]').value;
+    }
+
+    function setLegalActions(amounts) {
+        // a negative amount is an action the player cannot take
+        document.querySelectorAll('[data-action]').forEach(function (button) {
+            button.disabled = amounts[button.dataset.action] < 0;
+        });
+    }
+
+    function showMessage(text) {
+        const messages = document.getElementById('messages');
+        messages.innerHTML = '';
+        const item = document.createElement('li');
+        item.textContent = text;
+        messages.appendChild(item);
+    }
+
+    function apply(state) {
+        Object.keys(state).forEach(function (field) {
+            const value = state[field];
+            const cards = document.querySelector('[data-cards="' + field + '"]');
+            if (cards) {
+                // the number of images never changes, covers stand in for hidden or undealt cards
+                cards.querySelectorAll('img').forEach(function (image, i) {
+                    image.src = staticUrl + value[i];
+                });
+            } else if (field === 'legal_actions') {
+                setLegalActions(value);
+            } else if (field === 'show_opponent_cards') {
+                document.querySelector('[data-field="show_opponent_cards"]').textContent =
+                    (value ? 'Hide' : 'Show') + ' Opponent Cards';
+            } else {
+                const element = document.querySelector('[data-field="' + field + '"]');
+                if (element) {
+                    element.textContent = value;
+                }
+            }
+        });
+    }
+
+    function finish(message) {
+        showMessage(message);
+        document.querySelectorAll('[data-action]').forEach(function (button) {
+            button.disabled = true;
+        });
+    }
+
+    function handleEvent(frame) {
+        // one server-sent event: "event: <name>" and "data: <json>" lines
+        let name = 'message';
+        let data = '';
+        frame.split('\n').forEach(function (line) {
+            if (line.startsWith('event: ')) {
+                name = line.slice(7);
+            } else if (line.startsWith('data: ')) {
+                data += line.slice(6);
+            }
+        });
+        const payload = JSON.parse(data);
+        received += 1;
+        if (name === 'done') {
+            finish(payload.message);
+        } else {
+            apply(payload);
+        }
+    }
+
+    function sendAction(action) {
+        // the play endpoint streams the player's action, then each agent action as soon as it is decided
+        const body = new URLSearchParams({action: action});
+        return fetch('play', {
+            method: 'POST',
+            headers: {'X-CSRFToken': csrfToken()},
+            body: body,
+            credentials: 'same-origin'
+        }).then(function (response) {
+            if (!response.ok || !response.body) {
+                throw new Error(response.statusText);
+            }
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+
+            function read() {
+                return reader.read().then(function (chunk) {
+                    if (chunk.done) {
+                        return;
+                    }
+                    buffer += decoder.decode(chunk.value, {stream: true});
+                    let end;
+                    while ((end = buffer.indexOf('\n\n')) !== -1) {
+                        handleEvent(buffer.slice(0, end));
+                        buffer = buffer.slice(end + 2);
+                    }
+                    return read();
+                });
+            }
+
+            return read();
+        });
+    }
+
+    function sendActionJson(action) {
+        // the action endpoint answers once the agent is done, with the state delta of the whole exchange
+        return fetch('action', {
+            method: 'POST',
+            headers: {'X-CSRFToken': csrfToken()},
+            body: new URLSearchParams({action: action}),
+            credentials: 'same-origin'
+        }).then(function (response) {
+            if (!response.ok) {
+                throw new Error(response.statusText);
+            }
+            return response.json();
+        }).then(function (payload) {
+            if (payload.done) {
+                finish(payload.message);
+            } else {
+                apply(payload.state);
+            }
+        });
+    }
+
+    function submitForm(form, action) {
+        // the full page round trip
+        const input = document.createElement('input');
+        input.type = 'hidden';
+        input.name = 'action';
+        input.value = action;
+        form.appendChild(input);
+        form.submit();
+    }
+
+    document.querySelectorAll('form').forEach(function (form) {
+        form.addEventListener('submit', function (event) {
+            if (!event.submitter) {
+                return;
+            }
+            event.preventDefault();
+            const action = event.submitter.value;
+            const before = received;
+            sendAction(action).catch(function () {
+                if (received !== before) {
+                    showMessage('Connection lost, please try again.');
+                    return;
+                }
+                return sendActionJson(action).catch(function () {
+                    submitForm(form, action);
+                });
+            });
+        });
+    });
+})();